@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+"""
+Batch mode of the mp3 downgrader: the mp3 files of directories (recursively)
+or glob patterns are downgraded by a pool of processes, one file each. An
+output is skipped if it is newer than its input and was downgraded by the
+same factor or to the same target, which is recorded in an ID3v2 tag of the
+output, hence a rerun only processes new or changed files. An output is
+written to <file>.part first and renamed once complete, thus an interrupted
+run leaves no truncated mp3 files behind.
+"""
+
+import glob
+import os
+import timeit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mp3_downgrade import DEFAULT_PRESET, downgrade_stream, target_bit_rate
+
+SUFFIX = "_down.mp3"  # of the outputs next to their inputs
+PART_SUFFIX = ".part"
+TAG = "mp3_downgrade"  # description of the ID3v2 TXXX frame
+
+
+def id3_tag(
+        value: str
+) -> bytes:
+    """
+    :param value: of the TXXX frame
+    :return: ID3v2.3 tag with a single TXXX frame
+    """
+    body = b"\x00" + TAG.encode() + b"\x00" + value.encode()
+    frame = b"TXXX" + len(body).to_bytes(4, "big") + b"\x00\x00" + body
+    size = len(frame)
+
+    return b"ID3\x03\x00\x00" + bytes(
+        (size >> shift) & 0x7F for shift in (21, 14, 7, 0)) + frame
+
+
+def read_tag(
+        filepath: str
+) -> str | None:
+    """
+    :param filepath: mp3 file
+    :return: value of the TXXX frame written by id3_tag(), None if missing
+    """
+    def syncsafe(data: bytes) -> int:
+        return int.from_bytes(bytes(b & 0x7F for b in data), "big")
+
+    with open(filepath, "rb") as f:
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b"ID3":
+            return None
+        tag = f.read(syncsafe(header[6:10]))
+    pos = 0
+    while pos + 10 <= len(tag) and tag[pos:pos + 4] != bytes(4):
+        # frame sizes are syncsafe from ID3v2.4 on
+        size = syncsafe(tag[pos + 4:pos + 8]) if header[3] >= 4 \
+            else int.from_bytes(tag[pos + 4:pos + 8], "big")
+        body = tag[pos + 10:pos + 10 + size]
+        if tag[pos:pos + 4] == b"TXXX" \
+                and body[1:].startswith(TAG.encode() + b"\x00"):
+            return body[len(TAG) + 2:].decode(errors="replace")
+        pos += 10 + size
+
+    return None
+
+
+def downgraded(
+        filepath: str
+) -> bool:
+    """
+    :param filepath: mp3 file
+    :return: True if written by the downgrader, wherever it resides
+    """
+    try:
+        return read_tag(filepath) is not None
+    except OSError:
+        return False
+
+
+def find_inputs(
+        patterns: list[str]
+) -> tuple[list[tuple[str, str]], list[str]]:
+    """
+    :param patterns: mp3 files, directories, or glob patterns
+    :return: tuples of mp3 file and its path relative to the directory or
+    pattern it was found by, outputs of a previous run (by name or tag)
+    excluded, and the root directories of the patterns
+    """
+    found, roots = dict(), list()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = pattern
+            files = glob.glob(os.path.join(glob.escape(pattern), "**", "*.mp3"),
+                              recursive=True)
+        else:
+            files = glob.glob(pattern, recursive=True)
+            root = os.path.commonpath(
+                [os.path.dirname(os.path.abspath(f)) for f in files]) \
+                if files else None
+        if root is not None:
+            roots.append(root)
+        for filepath in sorted(files):
+            if os.path.isfile(filepath) \
+                    and not filepath.endswith((SUFFIX, PART_SUFFIX)) \
+                    and not downgraded(filepath):
+                found.setdefault(filepath, os.path.relpath(filepath, root))
+
+    return list(found.items()), roots
+
+
+def inside(
+        directory: str,
+        root: str
+) -> bool:
+    """
+    :param directory: e.g. of the outputs
+    :param root: directory
+    :return: True if directory is root or lies within it
+    """
+    directory, root = os.path.realpath(directory), os.path.realpath(root)
+
+    return os.path.commonpath([directory, root]) == root
+
+
+def output_path(
+        input_file: str,
+        relative: str,
+        directory: str = None
+) -> str:
+    """
+    :param input_file: mp3 file
+    :param relative: its path relative to the directory searched
+    :param directory: of the outputs, None for next to the input
+    :return: output file
+    """
+    if directory is None:
+        return os.path.splitext(input_file)[0] + SUFFIX
+
+    return os.path.join(directory, relative)
+
+
+def tag_value(
+        target: dict
+) -> str:
+    """
+    :param target: {'factor': float}, {'size': MB}, or {'bit_rate': kb/s},
+    optionally with 'mono': True, 'sample_rate': Hz, and 'preset': name
+    :return: e.g. factor=0.5
+    """
+    return ",".join("{0}={1}".format(*item) for item in target.items())
+
+
+def up_to_date(
+        input_file: str,
+        output_file: str,
+        target: dict
+) -> bool:
+    """
+    :param input_file: mp3 file
+    :param output_file: its downgraded version
+    :param target: see tag_value()
+    :return: True if the output is newer and was downgraded to target
+    """
+    try:
+        return os.path.getmtime(output_file) >= os.path.getmtime(input_file) \
+            and read_tag(output_file) == tag_value(target)
+    except OSError:
+        return False
+
+
+def downgrade_file(
+        target: dict,
+        input_file: str,
+        output_file: str
+) -> dict:
+    """
+    runs in a worker process, writes <output_file>.part renamed when done
+    :param target: see tag_value()
+    :param input_file: mp3 file
+    :param output_file: downgraded mp3 file
+    :return: sizes in bytes, duration of the audio and wall time in seconds
+    :raises ValueError: if the target is not below the input
+    """
+    t_start = timeit.default_timer()
+    bit_rate = None
+    if 'factor' not in target:
+        bit_rate = target_bit_rate(input_file=input_file,
+                                   size=target.get('size'),
+                                   bit_rate=target.get('bit_rate'))[
+            'out_bit_rate']
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    part_file = output_file + PART_SUFFIX
+    try:
+        with open(input_file, "rb") as read_file, \
+                open(part_file, "wb") as write_file:
+            write_file.write(id3_tag(tag_value(target)))
+            params = downgrade_stream(factor=target.get('factor', 1.),
+                                      read_file=read_file,
+                                      write_file=write_file,
+                                      bit_rate=bit_rate,
+                                      mono=target.get('mono', False),
+                                      sample_rate=target.get('sample_rate'),
+                                      preset=target.get('preset',
+                                                        DEFAULT_PRESET))
+        os.replace(part_file, output_file)
+    except BaseException:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise
+
+    return {
+        'input_bytes': os.path.getsize(input_file),
+        'output_bytes': os.path.getsize(output_file),
+        'duration': params['duration'],
+        'seconds': timeit.default_timer() - t_start
+    }
+
+
+def downgrade_batch(
+        *,
+        target: dict,
+        patterns: list[str],
+        directory: str = None,
+        jobs: int = None
+) -> int:
+    """
+    downgrade the mp3 files found by a pool of processes, largest first,
+    and print the realtime factor and space saved in total
+    :param target: downgrade factor, size or bit rate, see tag_value()
+    :param patterns: mp3 files, directories, or glob patterns
+    :param directory: of the outputs, None for next to the inputs
+    :param jobs: worker processes, None for one per CPU core
+    :return: exit code, 0: all downgraded, 1: all failed, 2: partial failure
+    """
+    t_start = timeit.default_timer()
+    inputs, roots = find_inputs(patterns)
+    if directory is not None:
+        for root in roots:
+            if inside(directory, root):
+                print("Error: output directory '{0}' is or lies within the "
+                      "input directory '{1}'.".format(directory, root))
+                return 1
+    tasks, skipped, failed = list(), 0, 0
+    for input_file, relative in inputs:
+        output_file = output_path(input_file, relative, directory)
+        if os.path.realpath(output_file) == os.path.realpath(input_file):
+            print("Error: output file equals input file '{}'.".format(
+                input_file))
+            failed += 1
+        elif up_to_date(input_file, output_file, target):
+            print("Skipping '{}', up to date.".format(output_file))
+            skipped += 1
+        else:
+            tasks.append((input_file, output_file))
+    if not tasks and not skipped and not failed:
+        print("Error: no mp3 files found in {}".format(", ".join(patterns)))
+        return 1
+    tasks.sort(key=lambda task: os.path.getsize(task[0]), reverse=True)
+
+    results = list()
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        futures = {pool.submit(downgrade_file, target, *task): task
+                   for task in tasks}
+        for future in as_completed(futures):
+            input_file, output_file = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print("Error: {0} - {1}".format(input_file, str(e)))
+                failed += 1
+                continue
+            results.append(result)
+            print("Downgraded '{0}' to '{1}': {2:.1f} MB -> {3:.1f} MB, "
+                  "{4:.1f}x realtime".format(
+                      input_file,
+                      output_file,
+                      result['input_bytes'] / 1024 ** 2,
+                      result['output_bytes'] / 1024 ** 2,
+                      result['duration'] / result['seconds']))
+
+    wall = timeit.default_timer() - t_start
+    duration = sum(r['duration'] for r in results)
+    size_in = sum(r['input_bytes'] for r in results)
+    size_out = sum(r['output_bytes'] for r in results)
+    print("\nFiles downgraded: {0}, skipped: {1}, failed: {2}".format(
+        len(results), skipped, failed))
+    if results:
+        print("Audio: {0:.1f} minutes in {1:.1f} seconds, {2:.1f}x realtime "
+              "({3:.1f}x per process)".format(
+                  duration / 60,
+                  wall,
+                  duration / wall,
+                  duration / sum(r['seconds'] for r in results)))
+        print("Space saved: {0:.1f} MB of {1:.1f} MB ({2:.0%})".format(
+            (size_in - size_out) / 1024 ** 2,
+            size_in / 1024 ** 2,
+            1 - size_out / size_in))
+
+    if failed == 0:
+        return 0
+    return 2 if results or skipped else 1
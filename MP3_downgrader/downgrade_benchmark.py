@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the encoder presets of the mp3 downgrader: a reference clip,
+the beginning of the input file, is decoded (and preprocessed) once and
+encoded with each preset in turn, the realtime factor, CPU time and size of
+the output are printed as a table. Only the encoding is timed.
+"""
+
+from time import perf_counter, process_time
+
+import mp3
+
+from mp3_downgrade import PRESETS, encode_segment, parameters, pcm_source
+
+CLIP = 30.  # seconds of the reference clip by default
+MODES = {mp3.MODE_STEREO: "stereo",
+         mp3.MODE_JOINT_STEREO: "joint stereo",
+         mp3.MODE_DUAL_CHANNEL: "dual channel",
+         mp3.MODE_SINGLE_CHANNEL: "mono"}
+
+
+def reference_clip(
+        *,
+        input_file: str,
+        params: dict,
+        seconds: float
+) -> bytes:
+    """
+    :param input_file: mp3 file
+    :param params: see parameters()
+    :param seconds: of the clip from the beginning of the input
+    :return: PCM data as fed to the encoder
+    """
+    with open(input_file, "rb") as read_file:
+        decoder = mp3.Decoder(read_file)
+        size = int(seconds * params['out_sample_rate']) \
+            * 2 * params['out_channels']
+        clip = bytearray()
+        source = pcm_source(decoder, params)
+        try:
+            for pcm_data in source:
+                clip += pcm_data
+                if len(clip) >= size:
+                    break
+        finally:
+            source.close()
+
+    return bytes(clip[:size])
+
+
+def benchmark(
+        *,
+        factor: float,
+        input_file: str,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        seconds: float = CLIP
+) -> int:
+    """
+    encode a reference clip with each preset and print realtime factor,
+    CPU time and size of the output
+    :param factor: multiplied with the bit rate of the input
+    :param input_file: mp3 file
+    :param bit_rate: of the output in kb/second, overrides factor
+    :param mono: downmix the output to one channel
+    :param sample_rate: of the output, None keeps the input's
+    :param seconds: of the reference clip
+    :return: exit code
+    """
+    with open(input_file, "rb") as read_file:
+        decoder = mp3.Decoder(read_file)
+        presets = {name: parameters(decoder, factor, bit_rate, mono,
+                                    sample_rate, name)
+                   for name in PRESETS}
+    params = next(iter(presets.values()))
+    clip = reference_clip(input_file=input_file,
+                          params=params,
+                          seconds=seconds)
+    duration = len(clip) / (2 * params['out_channels']
+                            * params['out_sample_rate'])
+    if not duration:
+        print("Error: no audio decoded from '{}'".format(input_file))
+        return 1
+    print("Reference clip: {0:.1f} seconds of '{1}', {2} channel(s), "
+          "{3} samples/second, {4} kb/second\n".format(
+              duration,
+              input_file,
+              params['out_channels'],
+              params['out_sample_rate'],
+              params['out_bit_rate']))
+    print("{:<10} {:>7} {:<12} {:>9} {:>8} {:>9} {:>9}".format(
+        "preset", "quality", "mode", "wall [s]", "cpu [s]", "realtime",
+        "size [KB]"))
+    row = "{:<10} {:>7} {:<12} {:>9.2f} {:>8.2f} {:>8.1f}x {:>9.1f}"
+    for name, preset in presets.items():
+        t_start, cpu_start = perf_counter(), process_time()
+        data = encode_segment(clip, preset)
+        wall, cpu = perf_counter() - t_start, process_time() - cpu_start
+        print(row.format(name,
+                         preset['quality'],
+                         MODES.get(preset['out_mode'], preset['out_mode']),
+                         wall,
+                         cpu,
+                         duration / wall,
+                         len(data) / 1024))
+
+    return 0
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+
+"""
+Frame headers and side information of MPEG audio layer III, as far as needed
+to stitch mp3 streams encoded in segments back together at a frame boundary.
+The main data of a frame may begin up to 511 bytes before its header in the
+data areas of the preceding frames (bit reservoir), hence a seam is only
+valid if the first stream leaves enough of its reservoir unused for the
+main data the second stream's frame has put there.
+
+The duration of a mp3 file is probed from the headers only: the Xing/Info or
+VBRI header of the first frame tells the number of frames, a stream whose
+first frames and frames sampled across the file are of equal bit rate is
+taken as CBR, otherwise the frame headers are walked.
+"""
+
+from typing import BinaryIO, Iterator, NamedTuple
+
+# layer III bit rates in kb/second by MPEG-1 and index
+BIT_RATES = {
+    True: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    False: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# sample rates by version bits: 3 MPEG-1, 2 MPEG-2, 0 MPEG-2.5
+SAMPLE_RATES = {3: (44100, 48000, 32000),
+                2: (22050, 24000, 16000),
+                0: (11025, 12000, 8000)}
+XING_TAGS = (b"Xing", b"Info")
+VBRI_OFFSET = 36  # of the VBRI header from the frame header
+SYNC_WINDOW = 64 * 1024  # bytes searched for the first frame
+CBR_FRAMES = 16  # frame headers of equal bit rate taken as CBR
+CBR_SAMPLES = 8  # positions across the file whose bit rate must match, too
+
+
+class Frame(NamedTuple):
+    offset: int  # of the header
+    length: int  # bytes including header
+    sample_rate: int
+    bit_rate: int  # kb/second
+    samples: int  # per channel
+    data: int  # offset of the data area following the side information
+    main_data_begin: int  # bytes of the main data before the data area
+    main_data_length: int  # bytes of the main data
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+
+def parse_header(
+        header: bytes
+) -> tuple[int, int, int, int] | None:
+    """
+    :param header: 4 bytes
+    :return: sample rate, bit rate in kb/second, frame length in bytes, and
+    samples per frame, None if not a valid layer III header
+    """
+    h = int.from_bytes(header, "big")
+    version, layer = (h >> 19) & 3, (h >> 17) & 3
+    bit_rate_index, sample_rate_index = (h >> 12) & 15, (h >> 10) & 3
+    if h >> 21 != 0x7FF or version == 1 or layer != 1 \
+            or bit_rate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bit_rate = BIT_RATES[mpeg1][bit_rate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (h >> 9) & 1
+    if mpeg1:
+        return sample_rate, bit_rate, 144000 * bit_rate // sample_rate \
+            + padding, 1152
+    return sample_rate, bit_rate, 72000 * bit_rate // sample_rate \
+        + padding, 576
+
+
+def parse_frame(
+        data: bytes,
+        offset: int
+) -> Frame | None:
+    """
+    :param data: mp3 byte string
+    :param offset: of the frame header
+    :return: frame, None if not a valid layer III frame
+    """
+    header = parse_header(data[offset:offset + 4])
+    if header is None:
+        return None
+    sample_rate, bit_rate, length, samples = header
+    mpeg1 = samples == 1152
+    channels = 1 if data[offset + 3] >> 6 == 3 else 2
+    start = offset + 4 + (0 if data[offset + 1] & 1 else 2)  # CRC
+    size = (17 if channels == 1 else 32) if mpeg1 \
+        else (9 if channels == 1 else 17)
+    if offset + length > len(data) or start + size > offset + length:
+        return None
+    bits = int.from_bytes(data[start:start + size], "big")
+    width = size * 8
+
+    def field(position: int, n: int) -> int:
+        return (bits >> (width - position - n)) & ((1 << n) - 1)
+
+    if mpeg1:
+        main_data_begin = field(0, 9)
+        position = 9 + (5 if channels == 1 else 3) + 4 * channels  # scfsi
+        granules, granule_bits = 2, 59
+    else:
+        main_data_begin = field(0, 8)
+        position = 8 + channels
+        granules, granule_bits = 1, 63
+    part2_3_length = 0
+    for _ in range(granules * channels):
+        part2_3_length += field(position, 12)
+        position += granule_bits
+
+    return Frame(offset=offset,
+                 length=length,
+                 sample_rate=sample_rate,
+                 bit_rate=bit_rate,
+                 samples=samples,
+                 data=start + size,
+                 main_data_begin=main_data_begin,
+                 main_data_length=(part2_3_length + 7) // 8)
+
+
+def frames(
+        data: bytes
+) -> list[Frame]:
+    """
+    :param data: mp3 byte string as written by the encoder
+    :return: consecutive frames, anything else is skipped
+    """
+    result = list()
+    offset = 0
+    while offset + 4 <= len(data):
+        frame = parse_frame(data, offset)
+        if frame is None:
+            offset += 1
+            continue
+        result.append(frame)
+        offset = frame.end
+
+    return result
+
+
+def unused(
+        stream: list[Frame],
+        index: int
+) -> int:
+    """
+    :param stream: frames
+    :param index: of a frame
+    :return: bytes of the reservoir left unused by the frames before
+    """
+    if index == 0:
+        return 0
+    last = stream[index - 1]
+
+    return last.end - last.data + last.main_data_begin \
+        - last.main_data_length
+
+
+def reservoir(
+        stream: list[Frame],
+        index: int,
+        size: int
+) -> Iterator[int]:
+    """
+    :param stream: frames
+    :param index: of a frame
+    :param size: bytes
+    :return: offsets of the last size bytes of the data areas before the
+    frame, backwards
+    """
+    for frame in reversed(stream[:index]):
+        for offset in range(frame.end - 1, frame.data - 1, -1):
+            if size == 0:
+                return
+            yield offset
+            size -= 1
+
+
+def seam(
+        first: list[Frame],
+        first_data: bytes,
+        second: list[Frame],
+        second_data: bytes,
+        shift: int,
+        window: range
+) -> int | None:
+    """
+    frame at which the second stream may take over from the first, both
+    encoding the same audio, the first frame within the window where both
+    streams are identical, otherwise the first one not overflowing the
+    reservoir of the first stream
+    :param first: frames of the first stream
+    :param first_data: first stream
+    :param second: frames of the second stream
+    :param second_data: second stream
+    :param shift: index in the first stream of the second's first frame
+    :param window: indexes in the first stream
+    :return: index in the first stream, None if there is no valid seam
+    """
+    candidates = [i for i in window
+                  if 0 < i - shift < len(second) and i < len(first)
+                  and second[i - shift].main_data_begin <= unused(first, i)]
+    for i in candidates:
+        a, b = first[i], second[i - shift]
+        if first_data[a.offset:a.end] == second_data[b.offset:b.end]:
+            return i
+
+    return candidates[0] if candidates else None
+
+
+def splice(
+        first: list[Frame],
+        first_data: bytes,
+        second: list[Frame],
+        second_data: bytes,
+        shift: int,
+        start: int,
+        index: int
+) -> bytearray:
+    """
+    frames of the first stream up to the seam, whose unused reservoir is
+    filled by the main data the second stream's frame at the seam begins
+    with, thus the second stream follows from the seam on
+    :param first: frames of the first stream
+    :param first_data: first stream
+    :param second: frames of the second stream
+    :param second_data: second stream
+    :param shift: index in the first stream of the second's first frame
+    :param start: index in the first stream of the first frame to return
+    :param index: seam in the first stream, see seam()
+    :return: bytes of the frames from start to the seam of the first stream
+    """
+    base = first[start].offset
+    result = bytearray(first_data[base:first[index].offset])
+    size = second[index - shift].main_data_begin
+    for a, b in zip(reservoir(first[start:], index - start, size),
+                    reservoir(second, index - shift, size)):
+        result[a - base] = second_data[b]
+
+    return result
+
+
+def first_frame(
+        data: bytes
+) -> Frame | None:
+    """
+    :param data: beginning of the audio
+    :return: first frame followed by another frame header or the end
+    """
+    for offset in range(len(data) - 3):
+        frame = parse_frame(data, offset)
+        if frame is not None and (
+                frame.end + 4 > len(data)
+                or parse_header(data[frame.end:frame.end + 4]) is not None):
+            return frame
+
+    return None
+
+
+def constant_bit_rate(
+        read_file: BinaryIO,
+        start: int,
+        size: int
+) -> bool:
+    """
+    :param read_file: seekable mp3 input
+    :param start: offset of the first frame
+    :param size: bytes of the audio
+    :return: True if the first frames and frames sampled across the file
+    are of equal bit rate
+    """
+    read_file.seek(start)
+    bit_rates = set()
+    for _ in range(CBR_FRAMES):
+        parsed = parse_header(read_file.read(4))
+        if parsed is None:
+            return False
+        bit_rates.add(parsed[1])
+        read_file.seek(parsed[2] - 4, 1)
+    for k in range(1, CBR_SAMPLES + 1):
+        read_file.seek(start + size * k // (CBR_SAMPLES + 1))
+        frame = first_frame(read_file.read(4096))
+        if frame is not None:
+            bit_rates.add(frame.bit_rate)
+
+    return len(bit_rates) == 1
+
+
+def probe(
+        read_file: BinaryIO,
+        size: int
+) -> dict:
+    """
+    duration of a mp3 file without decoding, within milliseconds unless
+    a VBR stream lacks a Xing or VBRI header
+    :param read_file: seekable mp3 input
+    :param size: bytes of the input
+    :return: duration in seconds, average bit rate in kb/second, sample
+    rate, and how the duration was determined
+    :raises ValueError: if no layer III frame is found
+    """
+    def syncsafe(data: bytes) -> int:
+        return int.from_bytes(bytes(b & 0x7F for b in data), "big")
+
+    read_file.seek(0)
+    head = read_file.read(10)
+    start = 0
+    if head[:3] == b"ID3" and len(head) == 10:
+        start = 10 + syncsafe(head[6:10]) + (10 if head[5] & 0x10 else 0)
+    end = size
+    if size >= 128:
+        read_file.seek(size - 128)
+        if read_file.read(3) == b"TAG":  # ID3v1
+            end -= 128
+    read_file.seek(start)
+    window = read_file.read(SYNC_WINDOW)
+    frame = first_frame(window)
+    if frame is None:
+        raise ValueError("no mp3 frame found")
+    audio = end - start - frame.offset
+    info = {"sample_rate": frame.sample_rate}
+
+    count = None
+    if window[frame.data:frame.data + 4] in XING_TAGS:
+        flags = int.from_bytes(window[frame.data + 4:frame.data + 8], "big")
+        if flags & 1:
+            count = int.from_bytes(window[frame.data + 8:frame.data + 12],
+                                   "big")
+            info["method"] = "xing"
+    elif window[frame.offset + VBRI_OFFSET:
+                frame.offset + VBRI_OFFSET + 4] == b"VBRI":
+        position = frame.offset + VBRI_OFFSET + 14
+        count = int.from_bytes(window[position:position + 4], "big")
+        info["method"] = "vbri"
+    if count is None and constant_bit_rate(read_file=read_file,
+                                           start=start + frame.offset,
+                                           size=audio):
+        info["method"] = "cbr"
+        info["bit_rate"] = frame.bit_rate
+        info["duration"] = audio * 8 / (frame.bit_rate * 1000)
+        return info
+    if count is None:
+        info["method"] = "headers"
+        read_file.seek(start + frame.offset)
+        count = 0
+        while (parsed := parse_header(read_file.read(4))) is not None:
+            count += 1
+            read_file.seek(parsed[2] - 4, 1)
+    info["duration"] = count * frame.samples / frame.sample_rate
+    info["bit_rate"] = audio * 8 / info["duration"] / 1000 \
+        if info["duration"] else 0.
+
+    return info
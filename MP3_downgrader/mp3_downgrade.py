@@ -2,24 +2,74 @@
 
 """
 Downgrade the quality of a mp3 input file to a smaller sized output file.
-A mp3 input file is read and converted to a wav file stored temporily in memory,
-subsequently converted again to a mp3 file by multiplying a factor <1
-to the bit-rate.
+A mp3 input file is decoded and the PCM data piped straight into the encoder
+of the mp3 output file, whose bit-rate is the input's multiplied by a
+factor <1. Decoding runs ahead in a thread through a bounded ring buffer,
+hence the memory stays at a few MB regardless of the duration.
+
+In parallel mode the decoded audio is cut into segments, which are encoded
+by a pool of processes, each one starting a little earlier to prime the
+encoder. The encoded segments are stitched together at a frame boundary
+within the overlap, where the bit reservoir permits, preferably where both
+encoders have converged to identical frames (see layer3.py).
+
+Instead of a factor, a target bit rate or size of the output file may be
+given, the bit rate needed is derived from the duration, which is probed
+from the mp3 headers without decoding.
+
+Optionally, the PCM data is downmixed to mono and/or resampled before
+encoding (see pcm.py, requires numpy).
+
+Embedded in other components, transcode() reads from a file-like object,
+a byte string or an iterable of chunks and writes to a file-like object or
+a callable, transcode_chunks() yields the encoded mp3 data instead, both
+print nothing and report progress by an optional callback.
+
+Presets trade encoding speed for quality by the algorithm quality of the
+encoder and its stereo mode, the bit rate stays constant (pymp3 offers no
+VBR/ABR), see downgrade_benchmark.py for a comparison.
 
 We utilized a template provided by
 https://github.com/miarec/pymp3
 """
 
-import wave
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from io import BytesIO
-from math import ceil
-from os import path
+from math import ceil, gcd
+from os import cpu_count, path
+from queue import Empty, Full, Queue
 from re import compile, findall
-from typing import Generator
+from threading import Event, Thread
+from time import perf_counter
+from types import SimpleNamespace
+from typing import BinaryIO, Callable, Generator, Iterable, Iterator
 
 import mp3
 
+from layer3 import SAMPLE_RATES, frames, probe, seam, splice
+
+PCM_CHUNK = 8000  # bytes read from the decoder at once
+RING_SLOTS = 32  # PCM chunks buffered between decoder and encoder
+MIN_SEGMENT = 10.  # seconds of audio encoded per process at least
+MAX_SEGMENT = 60.  # seconds, if the length of the input is unknown
+PRIMING = 1.  # seconds encoded ahead of a segment
+OVERLAP = 1.  # seconds encoded beyond a segment, where the seam is looked for
+MARGIN = 4  # frames before the end of a segment affected by the flush
+# layer III bit rates in kb/second of both MPEG-1 and MPEG-2, to which the
+# encoder resamples at low bit rates
+TARGET_BIT_RATES = (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160,
+                    192, 224, 256, 320)
+TAIL = 0.1  # seconds of encoder delay and padding in the output
+# quality of the encoder algorithm 0-highest, 9-fastest, and stereo mode
+PRESETS = {
+    'fast': {'quality': 7, 'mode': mp3.MODE_STEREO},
+    'balanced': {'quality': 5, 'mode': mp3.MODE_JOINT_STEREO},
+    'archival': {'quality': 2, 'mode': mp3.MODE_STEREO},
+}
+DEFAULT_PRESET = 'archival'
+
 
 class Range(object):
     def __init__(self, scope: str):
@@ -52,73 +102,568 @@ def print_error(text: str) -> None:
     exit(1)
 
 
-def downgrade(
+def decoded(
+        decoder: mp3.Decoder,
+        slots: int = RING_SLOTS
+) -> Generator[bytes, None, None]:
+    """
+    PCM data of the decoder, decoded by a thread ahead of the consumer
+    through a bounded ring buffer, hence reading the input overlaps encoding
+    :param decoder: mp3 decoder
+    :param slots: PCM chunks buffered at most
+    :return: generator of PCM chunks
+    """
+    ring = Queue(maxsize=slots)
+    stop = Event()
+
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                return ring.put(item, timeout=0.1)
+            except Full:
+                pass
+
+    def produce() -> None:
+        try:
+            while not stop.is_set() and (pcm_data := decoder.read(PCM_CHUNK)):
+                put(pcm_data)
+            put(None)
+        except Exception as e:  # re-raised by the consumer
+            put(e)
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (item := ring.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:  # consumer done or abandoned
+        stop.set()
+        try:
+            while True:
+                ring.get_nowait()
+        except Empty:
+            pass
+        producer.join()
+
+
+def parameters(
+        decoder: mp3.Decoder,
+        factor: float,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        preset: str = DEFAULT_PRESET
+) -> dict:
+    """
+    :param decoder: mp3 decoder
+    :param factor: multiplied with the bit rate of the input
+    :param bit_rate: of the output in kb/second, overrides factor
+    :param mono: downmix the output to one channel
+    :param sample_rate: of the output, None keeps the input's
+    :param preset: of the encoder, see PRESETS
+    :return: parameter of input and output
+    """
+    nchannels = decoder.get_channels()
+    out_channels = 1 if mono else nchannels
+
+    return {
+        "channels": nchannels,
+        "sample_rate": decoder.get_sample_rate(),
+        "bit_rate": decoder.get_bit_rate(),
+        "layer": decoder.get_layer(),
+        "mode": decoder.get_mode(),
+        "out_channels": out_channels,
+        "out_sample_rate": sample_rate or decoder.get_sample_rate(),
+        "out_bit_rate": bit_rate or ceil(decoder.get_bit_rate() * factor),
+        "out_mode": PRESETS[preset]['mode'] if out_channels == 2
+        else mp3.MODE_SINGLE_CHANNEL,
+        "quality": PRESETS[preset]['quality']
+    }
+
+
+def pcm_source(
+        decoder: mp3.Decoder,
+        params: dict
+) -> Iterator[bytes]:
+    """
+    :param decoder: mp3 decoder
+    :param params: see parameters()
+    :return: PCM chunks decoded, downmixed and resampled as the output
+    requires
+    """
+    chunks = decoded(decoder)
+    if params['out_channels'] == params['channels'] \
+            and params['out_sample_rate'] == params['sample_rate']:
+        return chunks
+    from pcm import preprocess  # requires numpy
+
+    return preprocess(chunks,
+                      channels=params['channels'],
+                      sample_rate=params['sample_rate'],
+                      mono=params['out_channels'] < params['channels'],
+                      out_sample_rate=params['out_sample_rate'])
+
+
+def encoder(
+        write_file: BinaryIO,
+        params: dict
+) -> mp3.Encoder:
+    """
+    :param write_file: mp3 output
+    :param params: see parameters()
+    :return: configured mp3 encoder
+    """
+    mp3_encoder = mp3.Encoder(write_file)
+    mp3_encoder.set_bit_rate(params['out_bit_rate'])
+    mp3_encoder.set_sample_rate(params['out_sample_rate'])
+    mp3_encoder.set_channels(params['out_channels'])
+    mp3_encoder.set_quality(params['quality'])
+    mp3_encoder.set_mode(params['out_mode'])
+
+    return mp3_encoder
+
+
+class ChunkReader(object):
+    """
+    file-like reader of an iterable of byte chunks, e.g. a http body
+    """
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+
+        return data
+
+
+def reader(
+        source: BinaryIO | bytes | Iterable[bytes]
+) -> BinaryIO | ChunkReader:
+    """
+    :param source: file-like object, mp3 byte string, or iterable of chunks
+    :return: object with a read method
+    """
+    if hasattr(source, "read"):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+
+    return ChunkReader(source)
+
+
+def writer(
+        sink: BinaryIO | Callable[[bytes], object]
+) -> BinaryIO | SimpleNamespace:
+    """
+    :param sink: file-like object, or callable taking each chunk
+    :return: object with a write method
+    """
+    return sink if hasattr(sink, "write") else SimpleNamespace(write=sink)
+
+
+def encoding(
+        decoder: mp3.Decoder,
+        params: dict,
+        mp3_encoder: mp3.Encoder
+) -> Generator[float, None, None]:
+    """
+    encode the PCM data of the decoder, the duration is added to params
+    when done
+    :param decoder: mp3 decoder
+    :param params: see parameters()
+    :param mp3_encoder: see encoder()
+    :return: generator of the seconds of audio encoded so far
+    """
+    rate = 2 * params['out_channels'] * params['out_sample_rate']
+    size = 0
+    source = pcm_source(decoder, params)
+    try:
+        for pcm_data in source:
+            mp3_encoder.write(pcm_data)
+            size += len(pcm_data)
+            yield size / rate
+    finally:
+        source.close()
+    mp3_encoder.flush()
+    params['duration'] = size / rate
+
+
+def transcode(
+        source: BinaryIO | bytes | Iterable[bytes],
+        sink: BinaryIO | Callable[[bytes], object],
+        *,
+        factor: float = 1.,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        preset: str = DEFAULT_PRESET,
+        started: Callable[[dict], None] = None,
+        progress: Callable[[float], None] = None
+) -> dict:
+    """
+    Decode the mp3 byte stream of source and encode it straight to sink at
+    the downgraded bit rate, no intermediate wav is held, memory is bounded
+    by the ring buffer between decoder and encoder. Nothing is printed.
+    :param source: mp3 input, file-like, byte string, or iterable of chunks
+    :param sink: mp3 output, file-like, or callable taking each chunk
+    :param factor: multiplied with the bit rate of the input
+    :param bit_rate: of the output in kb/second, overrides factor
+    :param mono: downmix the output to one channel
+    :param sample_rate: of the output, None keeps the input's
+    :param preset: of the encoder, see PRESETS
+    :param started: called with the parameter before encoding
+    :param progress: called with the seconds of audio encoded so far
+    :return: parameter of input and output, and the duration in seconds
+    """
+    decoder = mp3.Decoder(reader(source))
+    params = parameters(decoder, factor, bit_rate, mono, sample_rate, preset)
+    if started is not None:
+        started(params)
+
+    for seconds in encoding(decoder, params, encoder(writer(sink), params)):
+        if progress is not None:
+            progress(seconds)
+
+    return params
+
+
+def transcode_chunks(
+        source: BinaryIO | bytes | Iterable[bytes],
+        *,
+        factor: float = 1.,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        preset: str = DEFAULT_PRESET,
+        started: Callable[[dict], None] = None,
+        progress: Callable[[float], None] = None
+) -> Generator[bytes, None, dict]:
+    """
+    streaming form of transcode(), the mp3 data is yielded as the encoder
+    emits it, e.g. into a http response, the parameter are returned at the
+    end (StopIteration.value)
+    :param source: mp3 input, file-like, byte string, or iterable of chunks
+    :param factor: multiplied with the bit rate of the input
+    :param bit_rate: of the output in kb/second, overrides factor
+    :param mono: downmix the output to one channel
+    :param sample_rate: of the output, None keeps the input's
+    :param preset: of the encoder, see PRESETS
+    :param started: called with the parameter before encoding
+    :param progress: called with the seconds of audio encoded so far
+    :return: generator of mp3 chunks
+    """
+    decoder = mp3.Decoder(reader(source))
+    params = parameters(decoder, factor, bit_rate, mono, sample_rate, preset)
+    if started is not None:
+        started(params)
+
+    buffer = BytesIO()
+    steps = encoding(decoder, params, encoder(buffer, params))
+    try:
+        for seconds in steps:
+            if progress is not None:
+                progress(seconds)
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        steps.close()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+    return params
+
+
+def downgrade_stream(
         *,
         factor: float,
+        read_file: BinaryIO,
+        write_file: BinaryIO,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        preset: str = DEFAULT_PRESET,
+        started: Callable[[dict], None] = None
+) -> dict:
+    """
+    see transcode(), read_file may be any object with a read method, e.g.
+    a http response
+    :param factor: multiplied with the bit rate of the input
+    :param read_file: mp3 input
+    :param write_file: mp3 output
+    :param bit_rate: of the output in kb/second, overrides factor
+    :param mono: downmix the output to one channel
+    :param sample_rate: of the output, None keeps the input's
+    :param preset: of the encoder, see PRESETS
+    :param started: called with the parameter before encoding
+    :return: parameter of input and output, and the duration in seconds
+    """
+    return transcode(read_file,
+                     write_file,
+                     factor=factor,
+                     bit_rate=bit_rate,
+                     mono=mono,
+                     sample_rate=sample_rate,
+                     preset=preset,
+                     started=started)
+
+
+def encode_segment(
+        pcm_data: bytes,
+        params: dict
+) -> bytes:
+    """
+    runs in a worker process
+    :param pcm_data: PCM data of a segment
+    :param params: see parameters()
+    :return: mp3 byte string
+    """
+    write_file = BytesIO()
+    mp3_encoder = encoder(write_file, params)
+    for pos in range(0, len(pcm_data), PCM_CHUNK):
+        mp3_encoder.write(pcm_data[pos:pos + PCM_CHUNK])
+    mp3_encoder.flush()
+
+    return write_file.getvalue()
+
+
+def downgrade_parallel(
+        *,
+        factor: float,
+        read_file: BinaryIO,
+        write_file: BinaryIO,
+        jobs: int,
+        length: int = None,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        preset: str = DEFAULT_PRESET,
+        started: Callable[[dict], None] = None
+) -> dict:
+    """
+    Decode the mp3 byte stream of read_file and encode it in segments by
+    a pool of processes, the segments are stitched together sample
+    accurately at frame boundaries. The decoder feeds at most jobs + 1
+    segments in flight, hence the memory is bounded by their PCM data.
+    :param factor: multiplied with the bit rate of the input
+    :param read_file: mp3 input
+    :param write_file: mp3 output
+    :param jobs: worker processes
+    :param length: bytes of the input, if known, to size the segments
+    :param bit_rate: of the output in kb/second, overrides factor
+    :param mono: downmix the output to one channel
+    :param sample_rate: of the output, None keeps the input's
+    :param preset: of the encoder, see PRESETS
+    :param started: called with the parameter before encoding
+    :return: parameter of input and output, and the duration in seconds
+    :raises RuntimeError: if there is no valid seam between two segments
+    """
+    decoder = mp3.Decoder(read_file)
+    params = parameters(decoder, factor, bit_rate, mono, sample_rate, preset)
+    if started is not None:
+        started(params)
+
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    # the encoder may resample, segments start at input samples which
+    # coincide with the first sample of an output frame, the probe starts
+    # the workers before the decoder thread
+    probe = frames(pool.submit(encode_segment,
+                               bytes(PCM_CHUNK),
+                               params).result())[0]
+    in_rate, out_rate = params['out_sample_rate'], probe.sample_rate
+    divisor = gcd(in_rate, out_rate)
+    unit = in_rate // divisor * probe.samples \
+        // gcd(probe.samples, out_rate // divisor)
+    sample_bytes = 2 * params['out_channels']
+
+    def samples(seconds: float) -> int:
+        return max(1, ceil(seconds * in_rate / unit)) * unit
+
+    def frame_index(sample: int) -> int:
+        return sample * out_rate // in_rate // probe.samples
+
+    duration = MAX_SEGMENT if length is None \
+        else length * 8 / (params['bit_rate'] * 1000) / jobs
+    segment = samples(min(MAX_SEGMENT, max(MIN_SEGMENT, duration)))
+    priming, overlap = samples(PRIMING), samples(OVERLAP)
+
+    pending: deque[tuple[int, int, Future]] = deque()
+    previous = None  # frames, data and first frame index of a segment
+    written = 0  # frames of the previous segment written
+
+    def collect() -> None:
+        nonlocal previous, written
+        boundary, start, future = pending.popleft()
+        data = future.result()
+        stream = frames(data)
+        if previous is not None:
+            first, first_data, first_index = previous
+            shift = frame_index(start) - first_index
+            window = range(frame_index(boundary) - first_index,
+                           frame_index(boundary + overlap) - first_index
+                           - MARGIN)
+            index = seam(first, first_data, stream, data, shift, window)
+            if index is None:
+                raise RuntimeError(
+                    "no valid seam at {:.1f} seconds".format(
+                        boundary / in_rate))
+            write_file.write(
+                splice(first, first_data, stream, data, shift, written,
+                       index))
+            written = index - shift
+        previous = stream, data, frame_index(start)
+
+    with pool:
+        buffer = bytearray()
+        base = 0  # sample at the start of the buffer
+        boundary = 0  # first sample of the next segment
+        # closed on a seam error, too: the decoder thread is joined before
+        # the caller may seek the input for a retry
+        source = pcm_source(decoder, params)
+        try:
+            for pcm_data in source:
+                buffer += pcm_data
+                end = boundary + segment + overlap
+                if base + len(buffer) // sample_bytes < end:
+                    continue
+                start = max(0, boundary - priming)
+                pending.append((boundary, start, pool.submit(
+                    encode_segment,
+                    bytes(buffer[(start - base) * sample_bytes:
+                                 (end - base) * sample_bytes]),
+                    params)))
+                boundary += segment
+                del buffer[:(boundary - priming - base) * sample_bytes]
+                base = boundary - priming
+                while len(pending) > jobs:
+                    collect()
+        finally:
+            source.close()
+        start = max(0, boundary - priming)
+        pending.append((boundary, start, pool.submit(
+            encode_segment,
+            bytes(buffer[(start - base) * sample_bytes:]),
+            params)))
+        params['duration'] = (base + len(buffer) // sample_bytes) / in_rate
+        while pending:
+            collect()
+
+    stream, data, _ = previous
+    write_file.write(data[stream[written].offset:])
+
+    return params
+
+
+def target_bit_rate(
+        *,
         input_file: str,
-        output_file: str
-) -> int:
-    memory_file = BytesIO()
+        size: float = None,
+        bit_rate: float = None
+) -> dict:
+    """
+    :param input_file: mp3 file
+    :param size: of the output in MB
+    :param bit_rate: of the output in kb/second
+    :return: probe of the input, see layer3.probe(), and the bit rate of
+    the output in kb/second
+    :raises ValueError: if the target is not below the input or too small
+    """
+    with open(input_file, "rb") as read_file:
+        info = probe(read_file, path.getsize(input_file))
+    if size is not None:
+        bit_rate = size * 1024 ** 2 * 8 / 1000 / (info['duration'] + TAIL)
+    bit_rates = [b for b in TARGET_BIT_RATES if b <= bit_rate]
+    if not bit_rates:
+        raise ValueError("target below {} kb/second".format(
+            TARGET_BIT_RATES[0]))
+    if bit_rates[-1] >= info['bit_rate']:
+        raise ValueError("target not below the {:.0f} kb/second of the "
+                         "input".format(info['bit_rate']))
+    info['out_bit_rate'] = bit_rates[-1]
 
-    with (open(input_file, "rb") as read_file,
-          wave.open(memory_file, 'wb') as wav_file):
-        decoder = mp3.Decoder(read_file)
+    return info
 
-        sample_rate = decoder.get_sample_rate()
-        nchannels = decoder.get_channels()
-        bit_rate = decoder.get_bit_rate()
-        print(
-            f"Input file '{input_file}' parameter:\n"
-            f"Number of channels: {nchannels}\n"
-            f"Sample rate: {sample_rate} samples/second\n"
-            f"Bit rate: {bit_rate} kb/second\n"
-            f"Layer: {decoder.get_layer()}\n"
-            f"Mode: {decoder.get_mode()}\n"
-        )
-        wav_file.setnchannels(nchannels)
-        # Only PCM 16-bit sample size is supported for reconversion to mp3
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(sample_rate)
-        while True:
-             pcm_data = decoder.read(4000)
-             if not pcm_data:
-                 break
-             else:
-                 wav_file.writeframes(pcm_data)
-
-    print("Writing to output file ...\n")
-    memory_file.seek(0)
-
-    with (open(output_file, "wb") as write_file,
-          wave.open(memory_file) as wav_file):
-        encoder = mp3.Encoder(write_file)
-
-        frame_rate = wav_file.getframerate()
-        nchannels = wav_file.getnchannels()
-        bit_rate: int = ceil(bit_rate * factor)  # must be integer
-
-        encoder.set_bit_rate(bit_rate)
-        encoder.set_sample_rate(frame_rate)
-        encoder.set_channels(nchannels)
-        encoder.set_quality(2)   # 2-highest, 7-fastest
-        encoder.set_mode(
-            mp3.MODE_STEREO if nchannels == 2 else mp3.MODE_SINGLE_CHANNEL
-        )
-        while True:
-            pcm_data = wav_file.readframes(8000)
-            if pcm_data:
-                encoder.write(pcm_data)
-            else:
-                encoder.flush()
-                break
+
+def downgrade(
+        *,
+        factor: float,
+        input_file: str,
+        output_file: str,
+        jobs: int = 1,
+        bit_rate: int = None,
+        mono: bool = False,
+        sample_rate: int = None,
+        preset: str = DEFAULT_PRESET
+) -> int:
+    def started(params: dict) -> None:
         print(
-            f"Output file '{output_file}' parameter:\n"
-            f"Number of channels: {nchannels}\n"
-            f"Frame rate: {frame_rate} samples/second\n"
-            f"Bit rate: {bit_rate} kb/second\n"
-            f"Mode: {mp3.MODE_STEREO 
-            if nchannels == 2 else mp3.MODE_SINGLE_CHANNEL}"
+            "Input file '{0}' parameter:\n"
+            "Number of channels: {1}\n"
+            "Sample rate: {2} samples/second\n"
+            "Bit rate: {3} kb/second\n"
+            "Layer: {4}\n"
+            "Mode: {5}\n".format(input_file,
+                                  params['channels'],
+                                  params['sample_rate'],
+                                  params['bit_rate'],
+                                  params['layer'],
+                                  params['mode'])
         )
+        print("Writing to output file ...\n")
+
+    with (open(input_file, "rb") as read_file,
+          open(output_file, "wb") as write_file):
+        if jobs > 1:
+            try:
+                params = downgrade_parallel(factor=factor,
+                                            read_file=read_file,
+                                            write_file=write_file,
+                                            jobs=jobs,
+                                            length=path.getsize(input_file),
+                                            bit_rate=bit_rate,
+                                            mono=mono,
+                                            sample_rate=sample_rate,
+                                            preset=preset,
+                                            started=started)
+            except RuntimeError as e:
+                print("Note: {}, encoding in one process ...\n".format(e))
+                jobs = 1
+                read_file.seek(0)
+                write_file.seek(0)
+                write_file.truncate()
+                started = None
+        if jobs == 1:
+            params = downgrade_stream(factor=factor,
+                                      read_file=read_file,
+                                      write_file=write_file,
+                                      bit_rate=bit_rate,
+                                      mono=mono,
+                                      sample_rate=sample_rate,
+                                      preset=preset,
+                                      started=started)
+    print(
+        "Output file '{0}' parameter:\n"
+        "Number of channels: {1}\n"
+        "Frame rate: {2} samples/second\n"
+        "Bit rate: {3} kb/second\n"
+        "Mode: {4}".format(output_file,
+                           params['out_channels'],
+                           params['out_sample_rate'],
+                           params['out_bit_rate'],
+                           params['out_mode'])
+    )
 
     return 0
 
@@ -127,40 +672,147 @@ def main() -> None:
     mp3_validator = Validator(r"^.+\.mp3$")
     parser = ArgumentParser(
         description="Downgrades audio mp3 files from WDR3 concert web sites.")
-    parser.add_argument(
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
         '-f',
         '--factor',
-        required=True,
         help='Downgrade factor',
         type=float,
         choices=Range('[0.1, 1[')
     )
+    target.add_argument(
+        '--target-size',
+        type=float,
+        metavar='MB',
+        help='Size of the output file, the bit rate is derived from the '
+             'duration of the input')
+    target.add_argument(
+        '--target-bitrate',
+        type=float,
+        metavar='KBPS',
+        help='Bit rate of the output file in kb/second, rounded down to a '
+             'valid mp3 bit rate')
     parser.add_argument(
         '-i',
         '--input',
         required=True,
-        type=mp3_validator,
-        help='Input file (.mp3)')
+        nargs='+',
+        help='Input file (.mp3), or batch mode: directories, glob patterns, '
+             'or several files')
     parser.add_argument(
         '-o',
         '--output',
-        type=mp3_validator,
         nargs='?',
-        help='Output file (.mp3) (default=<input_file>_down.mp3)')
+        help='Output file (.mp3) (default=<input_file>_down.mp3), in batch '
+             'mode the directory of the outputs')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='Encoder processes, 0 for one per CPU core (default: 1, in '
+             'batch mode one per CPU core)')
+    parser.add_argument(
+        '--mono',
+        action='store_true',
+        help='Downmix to one channel before encoding (requires numpy)')
+    parser.add_argument(
+        '--sample-rate',
+        type=int,
+        choices=sorted(rate for rates in SAMPLE_RATES.values()
+                       for rate in rates),
+        metavar='HZ',
+        help='Resample to HZ samples/second before encoding (requires '
+             'numpy)')
+    parser.add_argument(
+        '--preset',
+        choices=PRESETS,
+        default=DEFAULT_PRESET,
+        help='Encoder speed versus quality (default: {})'.format(
+            DEFAULT_PRESET))
+    parser.add_argument(
+        '--benchmark',
+        type=float,
+        nargs='?',
+        const=30.,
+        metavar='SECONDS',
+        help='Encode the first SECONDS of the input file (default: 30) with '
+             'each preset and print realtime factor, CPU time and size')
+    pargs = parser.parse_args()
+    if pargs.mono or pargs.sample_rate is not None:
+        try:
+            import pcm  # noqa: F401, requires numpy
+        except ImportError:
+            print_error("Error: --mono and --sample-rate require numpy.")
+
+    jobs = cpu_count() or 1 if pargs.jobs == 0 else pargs.jobs
+    if len(pargs.input) > 1 or path.isdir(pargs.input[0]) \
+            or any(c in pargs.input[0] for c in "*?["):
+        from downgrade_batch import downgrade_batch
 
-    input_file = parser.parse_args().input
+        target = {'factor': pargs.factor} if pargs.factor is not None \
+            else {'size': pargs.target_size} \
+            if pargs.target_size is not None \
+            else {'bit_rate': pargs.target_bitrate}
+        if pargs.mono:
+            target['mono'] = True
+        if pargs.sample_rate is not None:
+            target['sample_rate'] = pargs.sample_rate
+        if pargs.preset != DEFAULT_PRESET:
+            target['preset'] = pargs.preset
+        exit(
+            downgrade_batch(
+                target=target,
+                patterns=pargs.input,
+                directory=pargs.output,
+                jobs=jobs
+            ))
+
+    input_file = mp3_validator(pargs.input[0])
     if not path.isfile(input_file):
         print_error("Error: input file '{}' does not exist.".format(input_file))
-    if parser.parse_args().output is None:
+    if pargs.output is None:
         output_file = path.splitext(input_file)[0] + "_down.mp3"
     else:
-        output_file = parser.parse_args().output
+        output_file = mp3_validator(pargs.output)
         if output_file == input_file:
             print_error("Error: output file equals input file.")
+    bit_rate = None
+    if pargs.factor is None:
+        try:
+            t_start = perf_counter()
+            info = target_bit_rate(input_file=input_file,
+                                   size=pargs.target_size,
+                                   bit_rate=pargs.target_bitrate)
+        except ValueError as e:
+            print_error("Error: {}.".format(e))
+        bit_rate = info['out_bit_rate']
+        print("Target bit rate: {0} kb/second for {1:.1f} seconds of audio "
+              "(probed from {2} in {3:.1f} ms)\n".format(
+                  bit_rate,
+                  info['duration'],
+                  info['method'],
+                  (perf_counter() - t_start) * 1e3))
+    if pargs.benchmark is not None:
+        from downgrade_benchmark import benchmark
+
+        exit(
+            benchmark(
+                factor=pargs.factor or 1.,
+                input_file=input_file,
+                bit_rate=bit_rate,
+                mono=pargs.mono,
+                sample_rate=pargs.sample_rate,
+                seconds=pargs.benchmark
+            ))
 
     exit(
         downgrade(
-            factor=parser.parse_args().factor,
+            factor=pargs.factor or 1.,
             input_file=input_file,
-            output_file=output_file
+            output_file=output_file,
+            jobs=jobs or 1,
+            bit_rate=bit_rate,
+            mono=pargs.mono,
+            sample_rate=pargs.sample_rate,
+            preset=pargs.preset
         ))
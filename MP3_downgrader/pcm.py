@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""
+Vectorized preprocessing of the decoded PCM data before encoding: downmix
+to mono and resampling to a lower sample rate, e.g. for spoken word or mono
+archival copies, which saves more than the bit rate alone and cuts the CPU
+time of the encoder in proportion. The chunks are processed as NumPy views
+of interleaved 16 bit samples, without loops per sample in Python.
+
+The resampler is a polyphase windowed sinc filter of the rational ratio of
+the sample rates, its state is carried over from chunk to chunk, hence the
+output is independent of the chunk sizes.
+"""
+
+from math import gcd
+from typing import Iterable, Iterator
+
+import numpy as np
+
+TAPS = 32  # filter length per phase
+ROLLOFF = 0.9  # cutoff relative to the Nyquist frequency of the output
+BETA = 8.  # Kaiser window
+
+
+class Resampler:
+    """
+    stateful resampler of interleaved 16 bit PCM chunks
+    """
+    def __init__(
+            self,
+            rate_in: int,
+            rate_out: int,
+            channels: int,
+            taps: int = TAPS
+    ) -> None:
+        """
+        :param rate_in: samples/second of the input
+        :param rate_out: samples/second of the output
+        :param channels: interleaved
+        :param taps: filter length per phase, even
+        """
+        divisor = gcd(rate_in, rate_out)
+        self.up, self.down = rate_out // divisor, rate_in // divisor
+        self.channels, self.half = channels, taps // 2
+        cutoff = min(1., self.up / self.down) * ROLLOFF
+        # distance of each tap from the output sample per phase
+        distance = (np.arange(taps) - self.half + 1)[None, :] \
+            - (np.arange(self.up) / self.up)[:, None]
+        window = np.i0(BETA * np.sqrt(np.clip(
+            1 - (distance / self.half) ** 2, 0., None))) / np.i0(BETA)
+        self.filter = (cutoff * np.sinc(cutoff * distance)
+                       * window).astype(np.float32)
+        self.filter /= self.filter.sum(axis=1, keepdims=True)
+        # leading silence, the first output sample is centred on input 0
+        self.buffer = np.zeros((self.half - 1, channels), dtype=np.float32)
+        self.offset = -(self.half - 1)  # input index of buffer[0]
+        self.index = 0  # of the next output sample
+        self.received = 0  # input samples
+
+    def __call__(
+            self,
+            samples: np.ndarray,
+            final: bool = False
+    ) -> np.ndarray:
+        """
+        :param samples: int16 array of shape (n, channels)
+        :param final: flush the filter at the end of the input
+        :return: int16 array of shape (m, channels)
+        """
+        self.received += len(samples)
+        parts = [self.buffer, samples.astype(np.float32)]
+        if final:
+            parts.append(np.zeros((self.half, self.channels),
+                                  dtype=np.float32))
+        self.buffer = np.concatenate(parts)
+        end = self.offset + len(self.buffer)  # input index after the buffer
+        # last output sample whose filter lies within the buffer
+        count = ((end - self.half) * self.up - 1) // self.down + 1 \
+            - self.index
+        if final:
+            count = min(count, -(-self.received * self.up // self.down)
+                        - self.index)
+        if count <= 0:
+            return np.empty((0, self.channels), dtype=np.int16)
+        positions = (self.index + np.arange(count)) * self.down
+        centres, phases = positions // self.up, positions % self.up
+        windows = np.lib.stride_tricks.sliding_window_view(
+            self.buffer, 2 * self.half, axis=0)  # (n, channels, taps)
+        result = np.matmul(windows[centres - self.half + 1 - self.offset],
+                           self.filter[phases][:, :, None])[..., 0]
+        self.index += count
+        # keep the input needed by the next output sample
+        keep = (self.index * self.down) // self.up - self.half + 1 \
+            - self.offset
+        self.buffer = self.buffer[keep:]
+        self.offset += keep
+
+        return np.clip(np.rint(result), -32768, 32767).astype(np.int16)
+
+
+def preprocess(
+        chunks: Iterable[bytes],
+        channels: int,
+        sample_rate: int,
+        mono: bool = False,
+        out_sample_rate: int = None
+) -> Iterator[bytes]:
+    """
+    :param chunks: interleaved 16 bit PCM data
+    :param channels: of the input
+    :param sample_rate: of the input
+    :param mono: downmix to one channel
+    :param out_sample_rate: resample to, None keeps the sample rate
+    :return: generator of processed PCM chunks
+    """
+    out_channels = 1 if mono else channels
+    resampler = Resampler(sample_rate, out_sample_rate, out_channels) \
+        if out_sample_rate not in (None, sample_rate) else None
+    rest = b""  # incomplete sample frame of the previous chunk
+    frame = 2 * channels
+    try:
+        for chunk in chunks:
+            data = rest + chunk
+            rest = data[len(data) // frame * frame:]
+            samples = np.frombuffer(
+                data, dtype="<i2",
+                count=len(data) // 2 // channels * channels) \
+                .reshape(-1, channels)
+            if mono and channels > 1:
+                samples = (samples.sum(axis=1, dtype=np.int32) // channels) \
+                    .astype(np.int16)[:, None]
+            if resampler is not None:
+                samples = resampler(samples)
+            if len(samples):
+                yield samples.astype("<i2").tobytes()
+    finally:  # closing the output closes a generator of chunks, too
+        if hasattr(chunks, "close"):
+            chunks.close()
+    if resampler is not None:
+        samples = resampler(np.empty((0, out_channels), dtype=np.int16),
+                            final=True)
+        if len(samples):
+            yield samples.astype("<i2").tobytes()
@@ -5,32 +5,46 @@ Downloads mp3 files from a site where the WDR3 concert player is located if
 there's only an afterhearing option of 30 days and, hence, no download button
 available. Copy the url of the site, where the concert resides and run the code:
 
-$ python3 WDR3_concert_downloader [-h] [-o <file>.mp3] <url>
+$ python3 WDR3_concert_downloader [-h] [-o <file>.mp3] [-c N] [-w N] [-d FACTOR]
+  <url>
+
+or in batch mode for many urls, given as arguments or in a file (- for stdin)
+
+$ python3 WDR3_concert_downloader [-o <dir>/] [-i <file>] [--concurrency N]
+  [--delay sec] [<url> ...]
+
+or in watch mode polling listing pages for new concerts
+
+$ python3 WDR3_concert_downloader --watch [<listing url> ...] [-o <dir>/]
+  [--interval sec] [--once]
 
 where e.g.
 url = https://www1.wdr.de/radio/wdr3/programm/sendungen/wdr3-konzert/konzertplayer-klassik-tage-alter-musik-in-herne-concerto-romano-alessandro-quarta-100.html
 Note: if there are multiple mp3 media objects available on the provided website,
 the files downloaded are named in following order:
-file.mp3, file(1).mp3, file(2).mp3, etc. according to the objects encountered in
-the html soup scan.
+file.mp3, file_1.mp3, file_2.mp3, etc. according to the objects encountered in
+the html soup scan. The files are downloaded simultaneously, the exit code is
+0 if all files were downloaded, 2 if some of them failed, and 1 otherwise.
+An interrupted download leaves <file>.part and <file>.part.json behind, rerun
+the same command to continue the download where it stopped.
 """
 
+import atexit
+import importlib
 import importlib.util
 import os.path
 import re
-from argparse import ArgumentParser
+import sys
+from argparse import ArgumentParser, FileType
+from functools import partial
 from sys import exit
-from typing import Annotated
-
-from pydantic import BaseModel, ValidationError, StringConstraints
+from types import ModuleType
+from typing import TextIO
 
-if importlib.util.find_spec("js2py_") is not None \
-        and os.path.isfile("{}/concert_downloader_js.py".format(
-    os.path.dirname(os.path.realpath(__file__)))
-):
-    from concert_downloader_js import wdr3_scraper
-else:
-    from concert_downloader1 import wdr3_scraper
+# the heavy dependencies (requests, bs4, js2py) are imported once the
+# arguments are parsed and validated, only the defaults are needed beforehand
+from defaults import (CACHE_FILE, CONCURRENCY, DELAY, INDEX_FILE, INTERVAL,
+                      LISTINGS, STATE_FILE, TTL, WORKERS)
 
 __author__ = "Dr. Ralf Antonius Timmermann"
 __copyright__ = ("Copyright (c) 2024-25, Dr. Ralf Antonius Timmermann "
@@ -45,48 +59,75 @@ __status__ = "Prod"
 WDR3_URL_PATTERN = re.compile(r"https://www1\.wdr\.de/radio/wdr3(.)*$")
 
 
-class TestURL(BaseModel):
-    url: Annotated[str, StringConstraints(pattern=WDR3_URL_PATTERN)]
+def scraper() -> ModuleType:
+    """
+    :return: scraper module, the js2py variant if the interpreter is installed
+    """
+    if importlib.util.find_spec("js2py_") is not None \
+            and os.path.isfile("{}/concert_downloader_js.py".format(
+        os.path.dirname(os.path.realpath(__file__)))
+    ):
+        return importlib.import_module("concert_downloader_js")
+    return importlib.import_module("concert_downloader1")
+
+
+def read_urls(
+        urls: list[str],
+        stream: TextIO = None
+) -> list[str]:
+    """
+    urls from the command line, supplemented by one url per line of a file
+    or stdin, blank lines and comments (#) are ignored
+    :param urls: urls from the command line
+    :param stream: opened file or sys.stdin
+    :return: urls without duplicates in order of appearance
+    """
+    lines = [line.strip() for line in stream] if stream is not None else []
+    candidates = urls + [line for line in lines
+                         if line and not line.startswith('#')]
+
+    return list(dict.fromkeys(candidates))
 
 
 def checks(
         url: str,
-        filepath: str = "download.mp3"
-) -> None:
+        filepath: str = "download.mp3",
+        fatal: bool = True
+) -> bool:
     """
     performs verious checks on url and file format and existance
     :param url: url string
     :param filepath: total file path
-    :return: None
+    :param fatal: exit on failure, otherwise return False
+    :return: True if all checks passed
     """
     try:
-        TestURL(url=url)
+        if not WDR3_URL_PATTERN.match(url):
+            raise ValueError(url)
         if not os.path.splitext(filepath)[1][1:] == "mp3":
             raise NameError(filepath)
-        dirname = os.path.dirname(filepath)
-        if not dirname: dirname = '.'
-        regex = re.compile(
-            r"{}(\(\d\))?.mp3".format(
-                os.path.splitext(os.path.basename(filepath))[0]
-            )
-        )
-        if [file for file in os.listdir(dirname) if regex.match(file)]:
+        # further files of a page and media objects archived under another
+        # name are looked up in the download index when downloaded
+        if os.path.exists(filepath):
             raise FileExistsError(filepath)
 
-        return
+        return True
 
-    except ValidationError as e:
-        print("Error: {0} - {1} does not match pattern {2}".format(
-            repr(e.errors()[0]['type']),
-            url,
+    except ValueError as e:
+        print("Error: {0} does not match pattern {1}".format(
+            e,
             WDR3_URL_PATTERN.pattern
         ))
     except NameError as e:
         print("Error: download filename '{}' is incorrect.".format(e))
     except FileExistsError as e:
-        print("Error: download file '{}' exists. Exiting ...".format(e))
+        print("Error: download file '{}' exists. {}".format(
+            e,
+            "Exiting ..." if fatal else "Skipping ..."))
 
-    exit(1)
+    if fatal:
+        exit(1)
+    return False
 
 
 def main() -> None:
@@ -97,21 +138,195 @@ def main() -> None:
         '--output',
         default='download.mp3',
         nargs='?',
-        help='Output file (.mp3) (default: download.mp3)')
+        help='Output file (.mp3) (default: download.mp3), in batch mode '
+             'the files are named after the web sites in its directory')
+    parser.add_argument(
+        '-c',
+        '--connections',
+        default=1,
+        type=int,
+        help='Parallel connections per mp3 file, falls back to one if the '
+             'server does not support Range requests (default: 1)')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        default=WORKERS,
+        type=int,
+        help='mp3 files of one web site downloaded simultaneously '
+             '(default: {})'.format(WORKERS))
+    parser.add_argument(
+        '-d',
+        '--downgrade',
+        type=float,
+        metavar='FACTOR',
+        help='Downgrade the bit rate by a factor in [0.1, 1[ while '
+             'downloading by one connection, bypassing the download index '
+             '(requires pymp3)')
+    parser.add_argument(
+        '-i',
+        '--input',
+        type=FileType('r'),
+        help='Batch mode: file with one URL per line, - for stdin')
+    parser.add_argument(
+        '--concurrency',
+        default=CONCURRENCY,
+        type=int,
+        help='Batch mode: simultaneous requests in total '
+             '(default: {})'.format(CONCURRENCY))
+    parser.add_argument(
+        '--delay',
+        default=DELAY,
+        type=float,
+        help='Batch mode: seconds between requests to the same host '
+             '(default: {})'.format(DELAY))
+    parser.add_argument(
+        '--cache',
+        default=CACHE_FILE,
+        help='Page cache (SQLite) of the mp3 urls (default: {})'.format(
+            CACHE_FILE))
+    parser.add_argument(
+        '--cache-ttl',
+        default=TTL,
+        type=float,
+        help='Seconds a cached page is used without revalidation '
+             '(default: {})'.format(TTL))
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the page cache')
+    parser.add_argument(
+        '--index',
+        default=INDEX_FILE,
+        help='Download index (SQLite) of the mp3 files archived '
+             '(default: {})'.format(INDEX_FILE))
+    parser.add_argument(
+        '--no-index',
+        action='store_true',
+        help='Do not use the download index')
+    parser.add_argument(
+        '--watch',
+        nargs='*',
+        metavar='LISTING',
+        help='Watch mode: poll listing pages (default: WDR3 Konzert) for '
+             'new concerts and download them into the directory of -o')
+    parser.add_argument(
+        '--interval',
+        default=INTERVAL,
+        type=float,
+        help='Watch mode: seconds between two polls (default: {})'.format(
+            INTERVAL))
+    parser.add_argument(
+        '--once',
+        action='store_true',
+        help='Watch mode: poll only once, e.g. from cron')
+    parser.add_argument(
+        '--state',
+        default=STATE_FILE,
+        help='Watch mode: state (SQLite) of the concerts found '
+             '(default: {})'.format(STATE_FILE))
+    parser.add_argument(
+        '--log-json',
+        metavar='FILE',
+        help='Append timing events (connect, first byte, extraction, '
+             'transfer, rate) as JSON lines to FILE, - for stderr')
+    parser.add_argument(
+        '--report',
+        metavar='FILE',
+        help='Write a JSON run report with percentiles per phase to FILE')
     parser.add_argument('url',
-                        help='URL of web site where concert player resides')
+                        nargs='*',
+                        help='URL(s) of web site(s) where concert player '
+                             'resides')
 
     pargs = parser.parse_args()
+    urls = read_urls(urls=pargs.url, stream=pargs.input)
+    if not urls and pargs.watch is None:
+        parser.error("at least one url is required")
+    if pargs.downgrade is not None and not 0.1 <= pargs.downgrade < 1.:
+        parser.error("downgrade factor must be in [0.1, 1[")
+    if pargs.downgrade is not None and pargs.connections > 1:
+        # the downgrade decodes one stream, no ranges, journal or validation
+        parser.error("-c/--connections cannot be combined with -d/--downgrade")
 
-    checks(
-        url=pargs.url,
-        filepath=pargs.output
-    )
+    if len(urls) == 1 and pargs.input is None and pargs.watch is None:
+        checks(
+            url=urls[0],
+            filepath=pargs.output
+        )
+
+    if pargs.log_json is not None or pargs.report is not None:
+        from timing import recorder
+
+        stream = None if pargs.log_json is None \
+            else sys.stderr if pargs.log_json == '-' \
+            else open(pargs.log_json, 'a')
+        recorder.configure(stream=stream, report=pargs.report is not None)
+        if stream not in (None, sys.stderr):
+            atexit.register(stream.close)
+        if pargs.report is not None:
+            atexit.register(recorder.write_report, pargs.report)
+
+    from download_index import DownloadIndex
+    from page_cache import PageCache
+
+    module = scraper()
+    cache = None if pargs.no_cache \
+        else PageCache(path=pargs.cache, ttl=pargs.cache_ttl)
+    index = None if pargs.no_index else DownloadIndex(path=pargs.index)
+
+    if pargs.watch is not None:
+        from watcher import WatchState, watch
+
+        with WatchState(path=pargs.state) as state:
+            exit(
+                watch(
+                    listings=pargs.watch or LISTINGS,
+                    extractor=partial(module.extract_mp3_urls, cache=cache),
+                    state=state,
+                    directory=os.path.dirname(pargs.output) or '.',
+                    index=index,
+                    interval=max(0., pargs.interval),
+                    connections=max(1, pargs.connections),
+                    concurrency=max(1, pargs.concurrency),
+                    delay=max(0., pargs.delay),
+                    once=pargs.once,
+                    factor=pargs.downgrade
+                )
+            )
+
+    if len(urls) == 1 and pargs.input is None:
+        exit(
+            module.wdr3_scraper(
+                url=urls[0],
+                filepath=pargs.output,
+                connections=max(1, pargs.connections),
+                workers=max(1, pargs.workers),
+                cache=cache,
+                index=index,
+                factor=pargs.downgrade
+            )
+        )
+
+    from batch import page_output, wdr3_batch
+
+    directory = os.path.dirname(pargs.output) or '.'
+    jobs = list()
+    for url in urls:
+        filepath = page_output(url=url, directory=directory)
+        if checks(url=url, filepath=filepath, fatal=False):
+            jobs.append((url, filepath))
+    if not jobs:
+        exit(1)
 
     exit(
-        wdr3_scraper(
-            url=pargs.url,
-            filepath=pargs.output
+        wdr3_batch(
+            jobs=jobs,
+            extractor=partial(module.extract_mp3_urls, cache=cache),
+            connections=max(1, pargs.connections),
+            concurrency=max(1, pargs.concurrency),
+            delay=max(0., pargs.delay),
+            index=index,
+            factor=pargs.downgrade
         )
     )
 
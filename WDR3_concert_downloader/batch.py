@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+Batch mode: many concert player sites are scanned and their mp3 files are
+downloaded within one invocation. All requests share one pooled
+HttpSession, the number of simultaneous requests is limited globally,
+and subsequent requests to the same host are delayed for politeness.
+"""
+
+import os
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import Callable
+from urllib.parse import urlsplit
+
+import requests
+
+from defaults import CONCURRENCY, DELAY
+from download_index import DownloadIndex
+from http_client import HttpSession
+from stream_download import download_task, exit_code, output_name
+
+
+class PoliteSession(HttpSession):
+    """
+    HttpSession with a connection pool sized for the concurrency and
+    a minimum delay between the start of two requests to the same host
+    """
+    def __init__(self, pool_size: int, delay: float = DELAY) -> None:
+        super().__init__(pool_size=pool_size)
+        self.delay = delay
+        self.__lock = Lock()
+        self.__next: dict[str, float] = dict()
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlsplit(url).netloc
+        with self.__lock:  # reserve the next slot for this host
+            now = time.monotonic()
+            slot = max(now, self.__next.get(host, now))
+            self.__next[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+        return super().request(method, url, *args, **kwargs)
+
+
+def page_output(
+        url: str,
+        directory: str = "."
+) -> str:
+    """
+    output file of a concert player site, named after its url
+    :param url: url of the concert player site
+    :param directory: output directory
+    :return: total file path
+    """
+    name = os.path.splitext(os.path.basename(urlsplit(url).path))[0]
+
+    return os.path.join(directory, "{}.mp3".format(name or "download"))
+
+
+def summary(
+        stats: dict[str, dict],
+        wall_time: float
+) -> None:
+    """
+    print a summary table of the batch run
+    :param stats: per page number of files, failures and bytes
+    :param wall_time: seconds
+    :return: None
+    """
+    print("\n{:<60} {:>5} {:>6} {:>10}".format(
+        "page", "files", "failed", "MB"))
+    for url, s in stats.items():
+        name = url if len(url) <= 60 else "..." + url[-57:]
+        print("{:<60} {:>5} {:>6} {:>10.1f}".format(
+            name, s['files'], s['failed'], s['bytes'] / 1024 ** 2))
+    total = sum(s['bytes'] for s in stats.values())
+    print("Pages scanned: {0}, files fetched: {1}, bytes: {2}, "
+          "wall time: {3:.1f} s".format(
+        sum(1 for s in stats.values() if s['scanned']),
+        sum(s['files'] for s in stats.values()),
+        total,
+        wall_time))
+
+
+def run_batch(
+        jobs: list[tuple[str, str]],
+        extractor: Callable[..., list[str]],
+        session: requests.Session,
+        connections: int = 1,
+        concurrency: int = CONCURRENCY,
+        index: DownloadIndex = None,
+        factor: float = None,
+        keep_existing: bool = False
+) -> dict[str, dict]:
+    """
+    scan many concert player sites and download their mp3 files
+    :param jobs: tuples of site url and total file path of its first download
+    :param extractor: function(url, session) returning the mp3 urls of a site
+    :param session: session shared by all requests
+    :param connections: parallel connections per mp3 file
+    :param concurrency: simultaneous page scans and mp3 downloads in total
+    :param index: optional download index, skips archived media objects
+    :param factor: optional downgrade factor of the bit rate
+    :param keep_existing: valid mp3 files in place count as downloaded
+    :return: per page scan error, number of files, failures and bytes
+    """
+    stats = {url: {'scanned': False, 'error': False,
+                   'files': 0, 'failed': 0, 'bytes': 0}
+             for url, _ in jobs}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # page scans are queued first, downloads are appended once known
+        scans = {pool.submit(extractor, url, session): (url, filepath)
+                 for url, filepath in jobs}
+        downloads = dict()
+        for future in as_completed(scans):
+            url, filepath = scans[future]
+            try:
+                mp3_urls = future.result()
+                stats[url]['scanned'] = True
+                if not mp3_urls:
+                    raise RuntimeWarning
+            except RuntimeWarning:
+                print("Warning: No mp3 link found under '{}' html."
+                      .format(url))
+                stats[url]['error'] = True
+                continue
+            except Exception as e:
+                print("Error: {0} - {1}".format(url, str(e)))
+                stats[url]['error'] = True
+                continue
+            for counter, mp3_url in enumerate(mp3_urls):
+                downloads[pool.submit(
+                    download_task,
+                    mp3_url,
+                    output_name(filepath=filepath, counter=counter),
+                    connections,
+                    session,
+                    index,
+                    factor,
+                    keep_existing)] = (url, mp3_url)
+        for future in as_completed(downloads):
+            url, mp3_url = downloads[future]
+            try:
+                stats[url]['bytes'] += future.result()
+                stats[url]['files'] += 1
+            except Exception as e:
+                print("Error: {0} - {1}".format(mp3_url, str(e)))
+                stats[url]['failed'] += 1
+
+    return stats
+
+
+def wdr3_batch(
+        jobs: list[tuple[str, str]],
+        extractor: Callable[..., list[str]],
+        connections: int = 1,
+        concurrency: int = CONCURRENCY,
+        delay: float = DELAY,
+        index: DownloadIndex = None,
+        factor: float = None
+) -> int:
+    """
+    scan many concert player sites, download their mp3 files, and print
+    a summary
+    :param jobs: tuples of site url and total file path of its first download
+    :param extractor: function(url, session) returning the mp3 urls of a site
+    :param connections: parallel connections per mp3 file
+    :param concurrency: simultaneous page scans and mp3 downloads in total
+    :param delay: seconds between two requests to the same host
+    :param index: optional download index, skips archived media objects
+    :param factor: optional downgrade factor of the bit rate
+    :return: exit code, 0: all downloaded, 1: all failed, 2: partial failure
+    """
+    t_start = timeit.default_timer()
+    with PoliteSession(pool_size=concurrency * connections,
+                       delay=delay) as session:
+        stats = run_batch(jobs=jobs,
+                          extractor=extractor,
+                          session=session,
+                          connections=connections,
+                          concurrency=concurrency,
+                          index=index,
+                          factor=factor)
+    summary(stats=stats, wall_time=timeit.default_timer() - t_start)
+
+    return exit_code(
+        failures=sum(s['failed'] + s['error'] for s in stats.values()),
+        total=sum(s['files'] + s['failed'] + s['error']
+                  for s in stats.values()))
@@ -1,55 +1,100 @@
 #!/usr/bin/env python3
 
 import re
+from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
+
+from fast_extract import fast_extract
+from download_index import DownloadIndex
+from http_client import HttpSession
+from page_cache import PageCache, conditional_get
+from stream_download import download_all, WORKERS
+from timing import recorder, timed
 
 PATTERN = re.compile(r'"audioURL"\s?:\s?"(.*\.mp3)"')
 
 
+@timed('page')
+def extract_mp3_urls(
+        url: str,
+        session: requests.Session = None,
+        cache: PageCache = None
+) -> list[str]:
+    """
+    scan the html of the concert player site for mp3 urls
+    :param url:
+    :param session: optional requests session to be reused
+    :param cache: optional page cache, skips fetch and parse if up to date
+    :return: mp3 urls in the order of the html scan
+    """
+    if cache is not None and (mp3_urls := cache.fresh(url)) is not None:
+        recorder.current()['cache'] = 'fresh'
+        return mp3_urls
+
+    # verificare e tentare d'aprire url iniziale, scan the raw bytes first
+    with conditional_get(url=url, session=session, cache=cache) as r:
+        if r.status_code == 304:
+            recorder.current()['cache'] = 'revalidated'
+            return cache.revalidated(url)
+        raw = bytearray()
+        # the protocol relative urls take the scheme of the site
+        mp3_urls = [urljoin(url, mp3_url) for mp3_url in
+                    fast_extract(response=r, raw=raw)]
+        if not mp3_urls:
+            # fallback: full parse of the html soup
+            from bs4 import BeautifulSoup
+
+            soup = BeautifulSoup(raw.decode(errors="replace"), "html.parser")
+
+            # extract content within script tags which matches regEx
+            for script in soup.find_all('script', text=PATTERN):
+                mp3_url = re.findall(PATTERN, script.text)
+
+                if mp3_url:
+                    mp3_urls.append(urljoin(url, mp3_url[0]))
+        recorder.current()['bytes'] = len(raw)
+        if cache is not None and mp3_urls:
+            cache.store(url=url, mp3_urls=mp3_urls, headers=r.headers)
+
+    return mp3_urls
+
+
 def wdr3_scraper(
         url: str,
-        filepath: str = "download.mp3"
+        filepath: str = "download.mp3",
+        connections: int = 1,
+        workers: int = WORKERS,
+        cache: PageCache = None,
+        index: DownloadIndex = None,
+        factor: float = None
 ) -> int:
     """
        download mp3(s)
        :param url:
        :param filepath:
-       :return: exit code
+       :param connections: parallel connections per mp3 file
+       :param workers: mp3 files downloaded simultaneously
+       :param cache: optional page cache
+       :param index: optional download index, skips archived media objects
+       :param factor: optional downgrade factor of the bit rate
+       :return: exit code, 2 if some of the downloads failed
        """
-    counter = 0
     try:
-        # verificare e tentare d'aprire url iniziale
-        r = requests.get(url=url)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        # extract content within script tags which matches regEx
-        for script in soup.find_all('script', text=PATTERN):
-            mp3_url = re.findall(PATTERN, script.text)
-
-            if mp3_url:
-                file_download = \
-                    filepath if counter == 0 else "{0}_{1}.mp3".format(
-                        filepath.rsplit(".", 1)[0],
-                        counter
-                    )
-                sneak_mp3 = "https:{}".format(mp3_url[0])
-                # apri l'oggetto mp3 e download suo contenuto binario sul file
-                mp3 = requests.get(url=sneak_mp3)
-                mp3.raise_for_status()
-                with open(file_download, 'wb') as f:
-                    f.write(mp3.content)
-                print("{1} downloaded to {0} successfully".format(
-                    file_download,
-                    sneak_mp3
-                ))
-                counter += 1
-        if counter == 0:
-            raise RuntimeWarning
-
-        return 0
+        with HttpSession(pool_size=workers * connections) as session:
+            mp3_urls = extract_mp3_urls(url=url, session=session, cache=cache)
+            if not mp3_urls:
+                raise RuntimeWarning
+
+            # apri gli oggetti mp3 e download loro contenuto binario sui file
+            return download_all(
+                mp3_urls=mp3_urls,
+                filepath=filepath,
+                connections=connections,
+                workers=workers,
+                session=session,
+                index=index,
+                factor=factor)
 
     except RuntimeWarning:
         print("Warning: No mp3 link found under '{}' html.".format(url))
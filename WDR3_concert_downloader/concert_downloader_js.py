@@ -2,69 +2,240 @@
 
 """
 this is an alternative solution for the concert_download1.py module
-see for conversion from JavaScript to Python 3.13
+the object literals assigned to globalObject.gseaInlineMediaData are decoded
+as JSON (JSON5 if installed), the JavaScript interpreter is evaluated only if
+decoding fails, see for conversion from JavaScript to Python 3.13
 https://github.com/PiotrDabkowski/Js2Py
 """
 
+import json
 import re
+from urllib.parse import urljoin
 
-import js2py_  # ECMA 6 support is still experimental, check for final development
 import requests
-from bs4 import BeautifulSoup
+
+from fast_extract import media_scripts
+from download_index import DownloadIndex
+from http_client import HttpSession
+from page_cache import PageCache, conditional_get
+from stream_download import download_all, WORKERS
+from timing import recorder, timed
+
+try:
+    import json5
+except ImportError:
+    json5 = None
 
 PATTERN = re.compile(r'"audioURL"\s?:\s?"(.*\.mp3)"')
+# assignment to the whole object or to one of its keys
+MEDIA_DATA = re.compile(
+    r"gseaInlineMediaData\s*(?:\[\s*([\"'])(.+?)\1\s*\])?\s*=\s*(?=\{)")
 # Javascript definitions and supplements
 JS_PREFIX = "var globalObject = {};\n"
-JS_SUFFIX = (
-    "var firstkey = Object.keys(globalObject.gseaInlineMediaData)[0];\n"
-    "globalObject.gseaInlineMediaData[firstkey];\n"
-)
+JS_SUFFIX = "globalObject.gseaInlineMediaData;\n"
+
+decoder = json.JSONDecoder()
+
+
+def literal_end(
+        script: str,
+        pos: int
+) -> int:
+    """
+    end of the object literal starting at pos, brackets within strings are
+    ignored
+    :param script: JavaScript source
+    :param pos: index of the opening brace
+    :return: index after the closing brace
+    :raises ValueError: if the object literal is not closed
+    """
+    depth, quote, escape = 0, None, False
+    for i in range(pos, len(script)):
+        c = script[i]
+        if quote:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    raise ValueError("unterminated object literal")
+
+
+def decode_literal(
+        script: str,
+        pos: int
+) -> dict:
+    """
+    decode the object literal starting at pos as JSON, or JSON5 if installed
+    :param script: JavaScript source
+    :param pos: index of the opening brace
+    :return: decoded object
+    :raises ValueError: if the object literal cannot be decoded
+    """
+    try:
+        return decoder.raw_decode(script, pos)[0]
+    except ValueError:
+        if json5 is None:
+            raise
+        return json5.loads(script[pos:literal_end(script=script, pos=pos)])
+
+
+def parse_media_data(
+        script: str
+) -> dict[str, dict]:
+    """
+    decode the object literals assigned to globalObject.gseaInlineMediaData
+    :param script: JavaScript source of a script tag
+    :return: media objects by their keys
+    :raises ValueError: if no object literal can be decoded
+    """
+    media = dict()
+    for match in MEDIA_DATA.finditer(script):
+        obj = decode_literal(script=script, pos=match.end())
+        if match[2] is None:  # whole object assigned
+            media.update(obj)
+        else:
+            media[match[2]] = obj
+    if not media:
+        raise ValueError("no gseaInlineMediaData object literal")
+
+    return media
+
+
+def eval_media_data(
+        script: str
+) -> dict[str, dict]:
+    """
+    evaluate the script by the JavaScript interpreter, slow fallback
+    :param script: JavaScript source of a script tag
+    :return: media objects by their keys
+    """
+    # imported on demand only, the interpreter takes most of a second to load
+    import js2py_  # ECMA 6 support is still experimental, check for final development
+
+    # js_dict is js2py_.base.JsObjectWrapper, not dict, it's an object!
+    js_dict = js2py_.eval_js(JS_PREFIX + script + JS_SUFFIX)
+
+    return js_dict.to_dict()
+
+
+def media_variants(
+        script: str
+) -> dict[str, dict[str, str]]:
+    """
+    all mediaResource variants with an audioURL of all media objects
+    :param script: JavaScript source of a script tag
+    :return: audioURL by variant (dflt, alt, ...) by media key
+    """
+    try:
+        media = parse_media_data(script=script)
+    except ValueError:
+        media = eval_media_data(script=script)
+
+    return {
+        key: {
+            variant: resource['audioURL']
+            for variant, resource in obj.get('mediaResource', {}).items()
+            if isinstance(resource, dict) and resource.get('audioURL')
+        }
+        for key, obj in media.items() if isinstance(obj, dict)
+    }
+
+
+@timed('page')
+def extract_mp3_urls(
+        url: str,
+        session: requests.Session = None,
+        cache: PageCache = None
+) -> list[str]:
+    """
+    scan the html of the concert player site for mp3 urls, the dflt variant
+    of each media object is preferred
+    :param url:
+    :param session: optional requests session to be reused
+    :param cache: optional page cache, skips fetch and parse if up to date
+    :return: mp3 urls in the order of the html scan
+    """
+    if cache is not None and (mp3_urls := cache.fresh(url)) is not None:
+        recorder.current()['cache'] = 'fresh'
+        return mp3_urls
+
+    # verificare e tentare d'aprire url iniziale, scan the raw bytes first
+    with conditional_get(url=url, session=session, cache=cache) as r:
+        if r.status_code == 304:
+            recorder.current()['cache'] = 'revalidated'
+            return cache.revalidated(url)
+        raw = bytearray()
+        scripts = media_scripts(response=r, raw=raw)
+        if not scripts:
+            # fallback: full parse of the html soup
+            from bs4 import BeautifulSoup
+
+            soup = BeautifulSoup(raw.decode(errors="replace"), "html.parser")
+            # extract content within script tags which matches regEx
+            scripts = [script.string
+                       for script in soup.find_all('script', text=PATTERN)]
+
+        mp3_urls = list()
+        for script in scripts:
+            for variants in media_variants(script=script).values():
+                mp3_url = variants.get('dflt') \
+                          or next(iter(variants.values()), None)
+
+                # the protocol relative urls take the scheme of the site
+                if mp3_url and urljoin(url, mp3_url) not in mp3_urls:
+                    mp3_urls.append(urljoin(url, mp3_url))
+        recorder.current()['bytes'] = len(raw)
+        if cache is not None and mp3_urls:
+            cache.store(url=url, mp3_urls=mp3_urls, headers=r.headers)
+
+    return mp3_urls
 
 
 def wdr3_scraper(
         url: str,
-        filepath: str = "download.mp3"
+        filepath: str = "download.mp3",
+        connections: int = 1,
+        workers: int = WORKERS,
+        cache: PageCache = None,
+        index: DownloadIndex = None,
+        factor: float = None
 ) -> int:
     """
     download mp3(s)
     :param url:
     :param filepath:
-    :return: exit code
+    :param connections: parallel connections per mp3 file
+    :param workers: mp3 files downloaded simultaneously
+    :param cache: optional page cache
+    :param index: optional download index, skips archived media objects
+    :param factor: optional downgrade factor of the bit rate
+    :return: exit code, 2 if some of the downloads failed
     """
-    counter = 0
     try:
-        # verificare e tentare d'aprire url iniziale
-        r = requests.get(url=url)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        # extract content within script tags which matches regEx
-        for script in soup.find_all('script', text=PATTERN):
-            # js_dict is js2py_.base.JsObjectWrapper, not dict, it's an object!
-            js_dict = js2py_.eval_js(JS_PREFIX + script.string + JS_SUFFIX)
-            mp3_url = js_dict['mediaResource']['dflt']['audioURL']
-
-            if mp3_url:
-                file_download = \
-                    filepath if counter == 0 else "{0}_{1}.mp3".format(
-                        filepath.rsplit(".", 1)[0],
-                        counter
-                    )
-                sneak_mp3 = "https:{}".format(mp3_url)
-                # apri l'oggetto mp3 e download suo contenuto binario sul file
-                mp3 = requests.get(url=sneak_mp3)
-                mp3.raise_for_status()
-                with open(file_download, 'wb') as f:
-                    f.write(mp3.content)
-                print("{1} downloaded to {0} successfully".format(
-                    file_download,
-                    sneak_mp3
-                ))
-                counter += 1
-        if counter == 0:
-            raise RuntimeWarning
-
-        return 0
+        with HttpSession(pool_size=workers * connections) as session:
+            mp3_urls = extract_mp3_urls(url=url, session=session, cache=cache)
+            if not mp3_urls:
+                raise RuntimeWarning
+
+            # apri gli oggetti mp3 e download loro contenuto binario sui file
+            return download_all(
+                mp3_urls=mp3_urls,
+                filepath=filepath,
+                connections=connections,
+                workers=workers,
+                session=session,
+                index=index,
+                factor=factor)
 
     except RuntimeWarning:
         print("Warning: No mp3 link found under '{}' html.".format(url))
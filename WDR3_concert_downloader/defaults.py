@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+"""
+Default settings of the downloader, shared by its modules and the command
+line. This module imports nothing but the standard library, hence the
+command line is parsed, and urls are validated, before the heavy
+dependencies (requests, bs4, js2py) are loaded.
+"""
+
+import os
+
+CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "wdr3_concert_downloader")
+WORKERS = 3  # mp3 files of one page downloaded simultaneously
+CONCURRENCY = 4  # simultaneous page scans and mp3 downloads in total
+DELAY = 0.5  # seconds between two requests to the same host
+CACHE_FILE = os.path.join(CACHE_DIR, "pages.sqlite")
+TTL = 3600.  # seconds a cached page is used without revalidation
+INDEX_FILE = os.path.join(CACHE_DIR, "downloads.sqlite")
+LISTINGS = [
+    "https://www1.wdr.de/radio/wdr3/programm/sendungen/wdr3-konzert/"
+    "index.html"
+]
+INTERVAL = 3600.  # seconds between two polls
+STATE_FILE = os.path.join(CACHE_DIR, "watch.sqlite")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""
+Persistent index of the mp3 files downloaded, keyed by their audioURL and by
+content (SHA-256 and size) in a SQLite database. Whether a media object is
+archived already is a single lookup instead of a scan of the output
+directory, and identical recordings downloaded under different names are
+replaced by hard links to the archived file.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from threading import Lock
+
+from defaults import INDEX_FILE
+
+
+def file_digest(
+        filepath: str
+) -> str:
+    """
+    SHA-256 of a file, read in constant memory
+    :param filepath: total file path
+    :return: hex digest
+    """
+    with open(filepath, 'rb') as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class DownloadIndex:
+    """
+    SQLite backed index of the mp3 files downloaded, may be shared among
+    threads
+    """
+    def __init__(self, path: str = INDEX_FILE) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__lock = Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "audio_url TEXT PRIMARY KEY, "
+                "filepath TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "sha256 TEXT NOT NULL, "
+                "downloaded REAL NOT NULL)")
+            self.__db.execute(
+                "CREATE INDEX IF NOT EXISTS content "
+                "ON downloads (sha256, size)")
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_val, exc_tb): self.close()
+
+    def archived(
+            self,
+            audio_url: str
+    ) -> str | None:
+        """
+        :param audio_url: url of the media object
+        :return: file path, if downloaded before and still existing
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT filepath FROM downloads WHERE audio_url = ?",
+                (audio_url,)).fetchone()
+        return row[0] if row and os.path.isfile(row[0]) else None
+
+    def duplicate(
+            self,
+            sha256: str,
+            size: int,
+            filepath: str
+    ) -> str | None:
+        """
+        :param sha256: hex digest of the content
+        :param size: bytes
+        :param filepath: total file path of the new download
+        :return: file path of an existing file with identical content
+        """
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT filepath FROM downloads "
+                "WHERE sha256 = ? AND size = ? AND filepath != ?",
+                (sha256, size, os.path.abspath(filepath))).fetchall()
+        return next((row[0] for row in rows if os.path.isfile(row[0])), None)
+
+    def add(
+            self,
+            audio_url: str,
+            filepath: str,
+            size: int,
+            sha256: str
+    ) -> None:
+        """
+        :param audio_url: url of the media object
+        :param filepath: total file path of the download
+        :param size: bytes
+        :param sha256: hex digest of the content
+        :return: None
+        """
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                (audio_url,
+                 os.path.abspath(filepath),
+                 size,
+                 sha256,
+                 time.time()))
+
+    def register(
+            self,
+            audio_url: str,
+            filepath: str
+    ) -> str | None:
+        """
+        add a completed download to the index, if its content is archived
+        already under another name, the file is replaced by a hard link
+        :param audio_url: url of the media object
+        :param filepath: total file path of the download
+        :return: file path of the identical recording or None
+        """
+        size = os.path.getsize(filepath)
+        sha256 = file_digest(filepath)
+        original = self.duplicate(sha256=sha256, size=size, filepath=filepath)
+        if original is not None:
+            tmp_path = filepath + ".link"
+            try:
+                os.link(original, tmp_path)
+                os.replace(tmp_path, filepath)
+            except OSError:  # e.g. different file systems, keep the copy
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self.add(audio_url=audio_url, filepath=filepath, size=size,
+                 sha256=sha256)
+
+        return original
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
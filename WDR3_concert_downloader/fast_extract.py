@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Fast path extraction of the mp3 urls: instead of parsing the whole html page
+with BeautifulSoup, the response is read incrementally and the raw bytes are
+scanned for <script> blocks carrying an "audioURL". The media blocks of the
+concert player follow each other, hence reading stops at the first script
+block without media after them, at the end of the html body, or after
+max_blocks media blocks were found.
+"""
+
+import re
+from typing import Iterable, Iterator
+
+import requests
+
+CHUNK_SIZE = 16 * 1024  # bytes
+SCRIPT_OPEN = b"<script"
+SCRIPT = re.compile(rb"<script\b[^>]*>(.*?)</script\s*>", re.S)
+AUDIO_URL = re.compile(rb'"audioURL"\s?:\s?"([^"]*?\.mp3)"')
+BODY_END = re.compile(rb"</body\s*>")
+
+
+def scan_scripts(
+        chunks: Iterable[bytes],
+        max_blocks: int = None,
+        raw: bytearray = None
+) -> Iterator[bytes]:
+    """
+    scan html byte chunks for script blocks with an audioURL, until the
+    first script block without one after them
+    :param chunks: html page in byte chunks
+    :param max_blocks: stop after this number of media blocks
+    :param raw: if provided, collects the bytes read for a fallback parse
+    :return: iterator over the contents of the media script blocks
+    """
+    buffer = b""
+    blocks = 0
+
+    for chunk in chunks:
+        if raw is not None:
+            raw.extend(chunk)
+        buffer += chunk
+        pos = 0
+        for match in SCRIPT.finditer(buffer):
+            if AUDIO_URL.search(match[1]):
+                yield match[1]
+                blocks += 1
+                if max_blocks is not None and blocks >= max_blocks:
+                    return
+            elif blocks:  # end of the media blocks
+                return
+            pos = match.end()
+        open_tag = buffer.find(SCRIPT_OPEN, pos)
+        if BODY_END.search(buffer, pos, len(buffer) if open_tag == -1
+                           else open_tag):
+            return
+        # keep an unclosed script block, or the tail of a split tag only
+        buffer = buffer[open_tag:] if open_tag != -1 \
+            else buffer[-len(SCRIPT_OPEN):]
+
+
+def scan_chunks(
+        chunks: Iterable[bytes],
+        max_blocks: int = None,
+        raw: bytearray = None
+) -> list[str]:
+    """
+    scan html byte chunks for script blocks with an audioURL, the first
+    audioURL of each block is returned
+    :param chunks: html page in byte chunks
+    :param max_blocks: stop after this number of media blocks
+    :param raw: if provided, collects the bytes read for a fallback parse
+    :return: mp3 urls (without scheme) in order of appearance
+    """
+    return [
+        AUDIO_URL.search(script)[1].decode().replace("\\/", "/")
+        for script in scan_scripts(chunks=chunks,
+                                   max_blocks=max_blocks,
+                                   raw=raw)
+    ]
+
+
+def fast_extract(
+        response: requests.Response,
+        max_blocks: int = None,
+        raw: bytearray = None
+) -> list[str]:
+    """
+    scan the streamed response of the concert player site for mp3 urls, the
+    caller closes the response, hence the connection, once the scan is done
+    :param response: response opened with stream=True
+    :param max_blocks: stop after this number of media blocks
+    :param raw: if provided, collects the bytes read for a fallback parse
+    :return: mp3 urls (without scheme) in order of appearance
+    """
+    return scan_chunks(
+        chunks=response.iter_content(chunk_size=CHUNK_SIZE),
+        max_blocks=max_blocks,
+        raw=raw)
+
+
+def media_scripts(
+        response: requests.Response,
+        max_blocks: int = None,
+        raw: bytearray = None
+) -> list[str]:
+    """
+    scan the streamed response of the concert player site for its media
+    script blocks, the caller closes the response once the scan is done
+    :param response: response opened with stream=True
+    :param max_blocks: stop after this number of media blocks
+    :param raw: if provided, collects the bytes read for a fallback parse
+    :return: contents of the media script blocks in order of appearance
+    """
+    return [
+        script.decode(errors="replace")
+        for script in scan_scripts(
+            chunks=response.iter_content(chunk_size=CHUNK_SIZE),
+            max_blocks=max_blocks,
+            raw=raw)
+    ]
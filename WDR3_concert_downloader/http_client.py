@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+"""
+Shared HTTP client layer of the scrapers and the download engine: every
+request has a connect and a read timeout, hence a stalled server no longer
+hangs a download forever. Responses 429 and 5xx as well as connection errors
+are retried after an exponential backoff with full jitter, a Retry-After
+header of the server is respected.
+
+The number of requests in flight per host is limited adaptively (AIMD): the
+limit starts at the size of the connection pool, a streamed response holds
+its slot until the body is closed, hence the connections a caller sized the
+pool for run at once. The limit grows by one per round trip as long as the
+time to the first byte stays close to the fastest observed, and it is halved
+on errors and throttling.
+
+The time to connect (DNS, TCP, TLS) of new connections and the time to the
+first byte of every response are passed to the timing recorder.
+"""
+
+import random
+import time
+from functools import cache
+from threading import Condition
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from timing import recorder
+
+TIMEOUT = (10., 60.)  # seconds to connect and between two received bytes
+RETRIES = 5  # attempts after the first one
+BACKOFF = 1.  # seconds, doubled per attempt
+BACKOFF_MAX = 60.  # seconds
+RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+POOL_SIZE = 10  # connections kept alive per host
+INITIAL_LIMIT = 4.  # requests in flight per host, unless the pool is given
+MAX_LIMIT = 16.
+LATENCY_FACTOR = 2.  # time to first byte tolerated relative to the fastest
+
+
+class ConnectTimer:
+    """
+    mixin of the urllib3 connections reporting the time to connect
+    """
+    def connect(self) -> None:
+        t_start = time.monotonic()
+        super().connect()
+        recorder.connected(time.monotonic() - t_start)
+
+
+class TimedHTTPConnection(ConnectTimer, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(ConnectTimer, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections report the time to connect
+    """
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool}
+
+
+class HostLimiter:
+    """
+    per host limit of the requests in flight, additive increase on fast
+    responses, multiplicative decrease on errors, shared among threads
+    """
+    def __init__(
+            self,
+            initial: float = INITIAL_LIMIT,
+            maximum: float = MAX_LIMIT
+    ) -> None:
+        self.initial, self.maximum = initial, maximum
+        self.__condition = Condition()
+        self.__hosts: dict[str, dict] = dict()
+
+    def limit(self, host: str) -> float:
+        with self.__condition:
+            return self.__host(host)['limit']
+
+    def __host(self, host: str) -> dict:
+        return self.__hosts.setdefault(
+            host, {'limit': self.initial, 'in_flight': 0, 'baseline': None})
+
+    def acquire(self, host: str) -> None:
+        """
+        block until a request to host may start
+        :param host: network location of the url
+        :return: None
+        """
+        with self.__condition:
+            state = self.__host(host)
+            self.__condition.wait_for(
+                lambda: state['in_flight'] < int(state['limit']))
+            state['in_flight'] += 1
+
+    def release(
+            self,
+            host: str,
+            latency: float = None,
+            error: bool = False
+    ) -> None:
+        """
+        a request to host has finished, adapt the limit
+        :param host: network location of the url
+        :param latency: seconds to the first byte of the response
+        :param error: request failed or was throttled
+        :return: None
+        """
+        with self.__condition:
+            state = self.__host(host)
+            state['in_flight'] -= 1
+            if error:
+                state['limit'] = max(1., state['limit'] / 2)
+            elif latency is not None:
+                baseline = state['baseline']
+                # the fastest response, slowly drifting upwards
+                state['baseline'] = latency if baseline is None \
+                    else min(latency, baseline + 0.05 * (latency - baseline))
+                if latency <= LATENCY_FACTOR * state['baseline']:
+                    state['limit'] = min(self.maximum,
+                                         state['limit'] + 1 / state['limit'])
+            self.__condition.notify_all()
+
+
+class HttpSession(requests.Session):
+    """
+    requests.Session with timeouts, retries with jittered exponential
+    backoff, and the adaptive per host limit of requests in flight, a
+    streamed response holds its slot until it is closed, hence the limit
+    starts at the pool size
+    """
+    def __init__(
+            self,
+            pool_size: int = POOL_SIZE,
+            timeout: tuple[float, float] = TIMEOUT,
+            retries: int = RETRIES,
+            limiter: HostLimiter = None
+    ) -> None:
+        super().__init__()
+        self.timeout, self.retries = timeout, retries
+        self.limiter = limiter or HostLimiter(
+            initial=float(pool_size),
+            maximum=max(MAX_LIMIT, float(pool_size)))
+        adapter = TimedAdapter(pool_connections=pool_size,
+                               pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            self.limiter.acquire(host)
+            recorder.request_started()
+            t_start = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.limiter.release(host, error=True)
+                recorder.responded(method=method,
+                                   url=url,
+                                   seconds=time.monotonic() - t_start,
+                                   attempt=attempt,
+                                   error=str(e))
+                if attempt >= self.retries \
+                        or isinstance(e, requests.exceptions.SSLError):
+                    raise
+                delay = None
+            else:
+                latency = time.monotonic() - t_start
+                recorder.responded(method=method,
+                                   url=url,
+                                   seconds=latency,
+                                   status=response.status_code,
+                                   attempt=attempt)
+                if response.status_code not in RETRY_STATUS \
+                        or attempt >= self.retries:
+                    self.__hold(response=response,
+                                host=host,
+                                latency=latency,
+                                stream=kwargs.get('stream', False))
+                    return response
+                self.limiter.release(host, error=True)
+                delay = retry_after(response)
+                response.close()
+            attempt += 1
+            time.sleep(backoff(attempt=attempt, minimum=delay))
+
+    def __hold(
+            self,
+            response: requests.Response,
+            host: str,
+            latency: float,
+            stream: bool
+    ) -> None:
+        if not stream:  # body read already
+            self.limiter.release(host, latency=latency,
+                                 error=response.status_code in RETRY_STATUS)
+            return
+        close = response.close
+
+        def close_once() -> None:
+            if response.close is not close:
+                response.close = close
+                self.limiter.release(
+                    host, latency=latency,
+                    error=response.status_code in RETRY_STATUS)
+            close()
+
+        response.close = close_once
+
+
+def backoff(
+        attempt: int,
+        minimum: float = None
+) -> float:
+    """
+    exponential backoff with full jitter
+    :param attempt: number of the retry, starting at 1
+    :param minimum: seconds requested by the server
+    :return: seconds to wait
+    """
+    delay = random.uniform(0., min(BACKOFF_MAX, BACKOFF * 2 ** (attempt - 1)))
+
+    return max(delay, min(BACKOFF_MAX, minimum or 0.))
+
+
+def retry_after(
+        response: requests.Response
+) -> float | None:
+    """
+    :param response: response 429 or 503
+    :return: seconds of the Retry-After header, if given in seconds
+    """
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+@cache
+def default_session() -> HttpSession:
+    """
+    :return: session shared by all callers not providing their own
+    """
+    return HttpSession()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""
+Incremental validation of a MPEG audio stream while it is downloaded: the
+frame headers are parsed frame by frame, checking the sync word, the frame
+length, and the consistency of version, layer and sample rate. A html error
+page, garbage, or a truncated tail is detected as soon as it arrives, the
+offset of the last valid frame tells where a Range request has to resume.
+"""
+
+from typing import Iterable
+
+# bit rates in kb/second by (MPEG-1, layer) and index
+BIT_RATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384,
+                416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320,
+                384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256,
+                320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192,
+                 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144,
+                 160),
+}
+BIT_RATES[(False, 3)] = BIT_RATES[(False, 2)]
+# sample rates by version bits: 3 MPEG-1, 2 MPEG-2, 0 MPEG-2.5
+SAMPLE_RATES = {3: (44100, 48000, 32000),
+                2: (22050, 24000, 16000),
+                0: (11025, 12000, 8000)}
+TRAILERS = (b"TAG", b"APETAGEX", b"LYRICS")  # tags following the last frame
+DURATION_TOLERANCE = 0.02  # relative, CBR streams only
+
+
+class FrameError(Exception):
+    """corrupt or truncated MPEG audio stream"""
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__("{} at byte {}".format(message, offset))
+        self.offset = offset  # end of the last valid frame
+
+
+def parse_header(
+        header: bytes
+) -> tuple[tuple, int, int, int] | None:
+    """
+    :param header: 4 bytes
+    :return: tuple of (version, layer, sample rate), bit rate in kb/second,
+    frame length in bytes, and samples per frame, None if invalid
+    """
+    h = int.from_bytes(header, "big")
+    version, layer = (h >> 19) & 3, 4 - ((h >> 17) & 3)
+    bit_rate_index, sample_rate_index = (h >> 12) & 15, (h >> 10) & 3
+    if h >> 21 != 0x7FF or version == 1 or layer == 4 \
+            or bit_rate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bit_rate = BIT_RATES[(mpeg1, layer)][bit_rate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (h >> 9) & 1
+    if layer == 1:
+        length, samples = (12000 * bit_rate // sample_rate + padding) * 4, 384
+    elif layer == 2 or mpeg1:
+        length, samples = 144000 * bit_rate // sample_rate + padding, 1152
+    else:  # layer III, MPEG-2/2.5
+        length, samples = 72000 * bit_rate // sample_rate + padding, 576
+
+    return (version, layer, sample_rate), bit_rate, length, samples
+
+
+class FrameValidator:
+    """
+    feed the byte stream chunk by chunk, FrameError is raised as soon as
+    the stream is corrupt, the state may be stored to resume validation
+    """
+    def __init__(self, state: dict = None) -> None:
+        state = state or dict()
+        self.offset = state.get('offset', 0)  # end of last valid frame
+        self.frames = state.get('frames', 0)
+        self.samples = state.get('samples', 0)
+        self.audio_start = state.get('audio_start')
+        self.stream = tuple(state['stream']) if state.get('stream') else None
+        self.bit_rates = set(state.get('bit_rates', []))
+        self.__buffer = b""
+        self.__skip = state.get('skip', 0)  # remaining bytes of an ID3v2 tag
+        self.__trailer = state.get('trailer', False)
+        self.__last = None  # length and samples of the last frame
+
+    @property
+    def state(self) -> dict:
+        return {
+            'offset': self.offset,
+            'frames': self.frames,
+            'samples': self.samples,
+            'audio_start': self.audio_start,
+            'stream': list(self.stream) if self.stream else None,
+            'bit_rates': sorted(self.bit_rates),
+            'skip': self.__skip,
+            'trailer': self.__trailer
+        }
+
+    @property
+    def duration(self) -> float:
+        """seconds of audio validated"""
+        return self.samples / self.stream[2] if self.stream else 0.
+
+    def feed(
+            self,
+            chunk: bytes
+    ) -> None:
+        """
+        :param chunk: next bytes of the stream
+        :return: None
+        :raises FrameError: if the stream is corrupt
+        """
+        if self.__trailer:
+            return
+        buffer = self.__buffer + chunk
+        pos = 0
+        if self.__skip:
+            pos = min(self.__skip, len(buffer))
+            self.__skip -= pos
+            self.offset += pos
+        if self.audio_start is None and not self.__skip:
+            if len(buffer) - pos < 10:
+                self.__buffer = buffer[pos:]
+                return
+            if buffer.startswith(b"ID3", pos):  # ID3v2 tag (+ footer)
+                size = 10 + sum((buffer[pos + 6 + i] & 0x7F) << (7 * (3 - i))
+                                for i in range(4)) \
+                       + (10 if buffer[pos + 5] & 0x10 else 0)
+                self.__skip = size
+                self.__buffer = b""
+                return self.feed(buffer[pos:])
+            self.audio_start = self.offset
+            if buffer[pos:pos + 1] == b"<":
+                raise FrameError("html instead of mp3", self.offset)
+
+        end = len(buffer)
+        while end - pos >= 4:
+            frame = parse_header(buffer[pos:pos + 4])
+            if frame is None or (self.stream and frame[0] != self.stream):
+                if self.frames and any(
+                        buffer.startswith(t, pos) for t in TRAILERS):
+                    self.__trailer = True
+                    break
+                if self.frames and any(
+                        t.startswith(buffer[pos:]) for t in TRAILERS):
+                    break  # the rest of a trailer is still to come
+                if self.__last:
+                    # garbage spliced in ends the preceding frame, too
+                    self.offset -= self.__last[0]
+                    self.frames -= 1
+                    self.samples -= self.__last[1]
+                    self.__last = None
+                raise FrameError("lost frame sync", self.offset)
+            stream, bit_rate, length, samples = frame
+            if end - pos < length:
+                break
+            self.stream = self.stream or stream
+            self.bit_rates.add(bit_rate)
+            self.frames += 1
+            self.samples += samples
+            self.offset += length
+            self.__last = length, samples
+            pos += length
+        self.__buffer = buffer[pos:]
+
+    def finish(
+            self,
+            content_length: int = None
+    ) -> None:
+        """
+        check the end of the stream and, for constant bit rate streams, the
+        duration expected from the content length
+        :param content_length: total bytes of the stream, if known
+        :return: None
+        :raises FrameError: if the stream is truncated
+        """
+        if not self.frames:
+            raise FrameError("no mpeg audio frame", self.offset)
+        if self.__buffer and not self.__trailer:
+            raise FrameError("truncated frame", self.offset)
+        if content_length and len(self.bit_rates) == 1:
+            expected = (content_length - self.audio_start) * 8 \
+                       / (next(iter(self.bit_rates)) * 1000)
+            if self.duration < expected * (1 - DURATION_TOLERANCE):
+                raise FrameError(
+                    "duration {:.0f} s instead of {:.0f} s".format(
+                        self.duration, expected),
+                    self.offset)
+
+
+def validate(
+        chunks: Iterable[bytes],
+        content_length: int = None
+) -> FrameValidator:
+    """
+    validate a complete stream, e.g. a file read in chunks
+    :param chunks: bytes of the stream
+    :param content_length: total bytes of the stream, if known
+    :return: validator
+    :raises FrameError: if the stream is corrupt or truncated
+    """
+    validator = FrameValidator()
+    for chunk in chunks:
+        validator.feed(chunk)
+    validator.finish(content_length=content_length)
+
+    return validator
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Persistent cache of the concert player sites: the page url is mapped to the
+mp3 urls extracted, the validators ETag/Last-Modified, and the time of the
+fetch in a SQLite database. Within the time to live (TTL) the mp3 urls are
+taken from the cache without any request, thereafter the page is requested
+conditionally (If-None-Match/If-Modified-Since) and parsing is skipped
+entirely if the server responds with 304 Not Modified.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+
+import requests
+
+from defaults import CACHE_FILE, TTL
+from http_client import default_session
+
+
+class PageCache:
+    """
+    SQLite backed cache of the mp3 urls of concert player sites, may be
+    shared among threads
+    """
+    def __init__(self, path: str = CACHE_FILE, ttl: float = TTL) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.__lock = Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, "
+                "mp3_urls TEXT NOT NULL, "
+                "etag TEXT, "
+                "last_modified TEXT, "
+                "fetched REAL NOT NULL)")
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_val, exc_tb): self.close()
+
+    def __row(self, url: str) -> tuple | None:
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT mp3_urls, etag, last_modified, fetched "
+                "FROM pages WHERE url = ?", (url,)).fetchone()
+
+    def fresh(
+            self,
+            url: str
+    ) -> list[str] | None:
+        """
+        :param url: url of the concert player site
+        :return: cached mp3 urls if fetched within the TTL, None otherwise
+        """
+        row = self.__row(url)
+        if row is None or time.time() - row[3] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def headers(
+            self,
+            url: str
+    ) -> dict:
+        """
+        :param url: url of the concert player site
+        :return: request headers for a conditional request
+        """
+        row = self.__row(url)
+        if row is None:
+            return dict()
+        return {k: v for k, v in (("If-None-Match", row[1]),
+                                  ("If-Modified-Since", row[2])) if v}
+
+    def revalidated(
+            self,
+            url: str
+    ) -> list[str]:
+        """
+        page not modified, renew the time of the fetch
+        :param url: url of the concert player site
+        :return: cached mp3 urls
+        """
+        with self.__lock, self.__db:
+            self.__db.execute("UPDATE pages SET fetched = ? WHERE url = ?",
+                              (time.time(), url))
+        return json.loads(self.__row(url)[0])
+
+    def store(
+            self,
+            url: str,
+            mp3_urls: list[str],
+            headers: dict
+    ) -> None:
+        """
+        :param url: url of the concert player site
+        :param mp3_urls: mp3 urls extracted
+        :param headers: response headers carrying the validators
+        :return: None
+        """
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (url,
+                 json.dumps(mp3_urls),
+                 headers.get("ETag"),
+                 headers.get("Last-Modified"),
+                 time.time()))
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
+
+
+def conditional_get(
+        url: str,
+        session: requests.Session = None,
+        cache: PageCache = None
+) -> requests.Response:
+    """
+    request the concert player site streamed, conditionally if cached
+    :param url: url of the concert player site
+    :param session: optional requests session to be reused
+    :param cache: optional page cache
+    :return: response with status 200 or 304, to be closed by the caller
+    :raises requests.HTTPError: if the server responds with an error
+    """
+    headers = cache.headers(url) if cache is not None else dict()
+    r = (session or default_session()).get(url=url,
+                                            headers=headers,
+                                            stream=True)
+    if r.status_code != 304:
+        try:
+            r.raise_for_status()
+        except requests.HTTPError:
+            r.close()
+            raise
+
+    return r
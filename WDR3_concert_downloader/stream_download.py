@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+
+"""
+Streaming download engine for the mp3 media objects. The response body is
+written chunk by chunk to a temporary <file>.part residing in the target
+directory, which is renamed to its final name once the transfer has
+completed. Hence, the peak memory stays flat regardless of the size of the
+concert recording.
+
+Downloads are resumable: a sidecar journal <file>.part.json records the url,
+the validators ETag/Last-Modified and the bytes written so far. A subsequent
+run continues with a Range request, provided the validators still match
+(If-Range), otherwise the server delivers the whole file from scratch.
+
+Optionally, a file is fetched by several connections in parallel: the file
+is split into byte ranges, which are written at their offsets into the
+preallocated partial file. Completed ranges are recorded in the journal, too,
+along with the number of connections, a run with another number starts over.
+
+All mp3 files found on one page are downloaded concurrently by a bounded pool
+of workers, the file names follow the order of the html scan.
+
+The MPEG frame headers are validated while the bytes arrive: a html error
+page, garbage or a truncated tail is detected early, the partial file is cut
+back to the last valid frame, and only the bad tail is fetched again.
+
+If a downgrade factor is given, the byte stream is decoded and encoded at the
+downgraded bit rate while it arrives, only the small output hits the disk.
+"""
+
+import json
+import os
+import sys
+import timeit
+from concurrent.futures import (ThreadPoolExecutor, FIRST_EXCEPTION, wait,
+                                as_completed)
+from functools import partial
+from threading import Lock
+
+import requests
+
+from defaults import WORKERS
+from download_index import DownloadIndex
+from http_client import default_session
+from mp3_frames import FrameError, FrameValidator, validate
+from timing import recorder
+
+CHUNK_SIZE = 256 * 1024  # bytes
+JOURNAL_INTERVAL = 32 * CHUNK_SIZE  # bytes between journal updates
+PART_SUFFIX = ".part"
+JOURNAL_SUFFIX = ".part.json"
+RETRIES = 3  # range requests of a corrupt or cut off tail
+# connection lost within a response body, e.g. Content-Length not reached
+INCOMPLETE = (requests.exceptions.ChunkedEncodingError,
+              requests.exceptions.ConnectionError)
+DOWNGRADER_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "MP3_downgrader")
+
+
+class RangeError(Exception):
+    """server ignores the Range request header"""
+
+
+class CountingReader:
+    """
+    file-like wrapper counting the bytes read from a stream
+    """
+    def __init__(self, stream) -> None:
+        self.stream, self.size = stream, 0
+    def read(self, n: int = -1) -> bytes:
+        data = self.stream.read(n)
+        self.size += len(data)
+        return data
+
+
+def read_journal(
+        filepath: str,
+        url: str
+) -> dict | None:
+    """
+    load the journal of a previously interrupted download, if it refers to
+    the same url and the partial file is still in place
+    :param filepath: total file path of the download
+    :param url: url of the media object
+    :return: journal dictionary or None
+    """
+    try:
+        with open(filepath + JOURNAL_SUFFIX, 'r') as f:
+            journal = json.load(f)
+        if journal.get('url') != url:
+            return None
+        # trust the file on disk rather than the last journal entry
+        journal['bytes'] = os.path.getsize(filepath + PART_SUFFIX)
+        return journal
+    except (OSError, ValueError):
+        return None
+
+
+def write_journal(
+        filepath: str,
+        journal: dict
+) -> None:
+    """
+    write the journal atomically next to the partial file
+    :param filepath: total file path of the download
+    :param journal: dictionary with url, etag, last_modified and bytes
+    :return: None
+    """
+    tmp_path = filepath + JOURNAL_SUFFIX + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(journal, f)
+    os.replace(tmp_path, filepath + JOURNAL_SUFFIX)
+
+
+def remove_journal(
+        filepath: str
+) -> None:
+    """
+    remove partial file and journal of a download
+    :param filepath: total file path of the download
+    :return: None
+    """
+    for suffix in (PART_SUFFIX, JOURNAL_SUFFIX):
+        if os.path.exists(filepath + suffix):
+            os.remove(filepath + suffix)
+
+
+def stream_download(
+        url: str,
+        filepath: str,
+        session: requests.Session = None,
+        chunk_size: int = CHUNK_SIZE,
+        retries: int = RETRIES
+) -> tuple[int, float]:
+    """
+    download url to filepath in constant memory, resume a previously
+    interrupted download if possible, a corrupt or cut off tail is fetched
+    again
+    :param url: url of the media object
+    :param filepath: total file path of the download
+    :param session: optional requests session to be reused
+    :param chunk_size: bytes read per iteration
+    :param retries: range requests of a corrupt or cut off tail
+    :return: tuple of bytes transferred and elapsed time in seconds
+    :raises requests.HTTPError: if the server responds with an error
+    :raises FrameError: if the media object is no valid mp3 stream
+    """
+    getter = (session or default_session()).get
+    tmp_path = filepath + PART_SUFFIX
+    headers = dict()
+    size = 0
+
+    journal = read_journal(filepath=filepath, url=url)
+    if journal and 'done' in journal:  # left over by segmented download
+        journal = None
+    if journal and journal.get('frames') \
+            and journal['frames']['offset'] < journal['bytes']:
+        # continue after the last valid frame
+        with open(tmp_path, 'r+b') as f:
+            f.truncate(journal['frames']['offset'])
+        journal['bytes'] = journal['frames']['offset']
+    if journal and journal['bytes'] > 0 \
+            and (validator := journal.get('etag')
+                 or journal.get('last_modified')):
+        headers['Range'] = "bytes={}-".format(journal['bytes'])
+        headers['If-Range'] = validator
+
+    t_start = timeit.default_timer()
+    receiving = False  # the response body has begun
+    try:
+        with getter(url=url, headers=headers, stream=True) as response:
+            if response.status_code == 416:  # range not satisfiable
+                response.close()  # free the connection before starting over
+                remove_journal(filepath=filepath)
+                return stream_download(url=url,
+                                       filepath=filepath,
+                                       session=session,
+                                       chunk_size=chunk_size,
+                                       retries=retries)
+            response.raise_for_status()
+            if response.status_code == 206:
+                offset, mode = journal['bytes'], 'ab'
+                # without a validator state the frames cannot be resynced
+                frames = FrameValidator(state=journal['frames']) \
+                    if journal.get('frames') else None
+                print("Resuming {} at byte {}".format(url, offset))
+            else:  # validators changed or no range support: full body
+                offset, mode = 0, 'wb'
+                frames = FrameValidator()
+            length = int(response.headers['Content-Length']) + offset \
+                if 'Content-Length' in response.headers else None
+            journal = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'bytes': offset
+            }
+            write_journal(filepath=filepath, journal=journal)
+
+            with open(tmp_path, mode) as f:
+                receiving = True
+                try:
+                    unsaved = 0
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+                        unsaved += len(chunk)
+                        if frames is not None:
+                            frames.feed(chunk)
+                        if unsaved >= JOURNAL_INTERVAL:
+                            f.flush()
+                            journal['bytes'] = f.tell()
+                            if frames is not None:
+                                journal['frames'] = frames.state
+                            write_journal(filepath=filepath, journal=journal)
+                            unsaved = 0
+                    if frames is not None:
+                        frames.finish(content_length=length)
+                except FrameError as e:
+                    # keep the valid frames only
+                    f.truncate(e.offset)
+                    f.seek(e.offset)
+                    raise
+                finally:
+                    f.flush()
+                    journal['bytes'] = f.tell()
+                    if frames is not None:
+                        journal['frames'] = frames.state
+                    write_journal(filepath=filepath, journal=journal)
+    except FrameError as e:
+        if e.offset == 0 or retries <= 0:  # not a mp3 file at all
+            if e.offset == 0:
+                remove_journal(filepath=filepath)
+            raise
+        print("{0}: {1}, fetching again from there".format(url, str(e)))
+        retried, _ = stream_download(url=url,
+                                     filepath=filepath,
+                                     session=session,
+                                     chunk_size=chunk_size,
+                                     retries=retries - 1)
+        return size + retried, timeit.default_timer() - t_start
+    except INCOMPLETE as e:
+        if not receiving or retries <= 0:
+            raise
+        # the journal holds the last valid frame to resume from
+        print("{0}: {1}, fetching the rest".format(url, str(e)))
+        retried, _ = stream_download(url=url,
+                                     filepath=filepath,
+                                     session=session,
+                                     chunk_size=chunk_size,
+                                     retries=retries - 1)
+        return size + retried, timeit.default_timer() - t_start
+    elapsed = timeit.default_timer() - t_start
+
+    # rename is atomic, a reader never encounters a half written file
+    os.replace(tmp_path, filepath)
+    os.remove(filepath + JOURNAL_SUFFIX)
+
+    return size, elapsed
+
+
+def segmented_download(
+        url: str,
+        filepath: str,
+        connections: int,
+        session: requests.Session = None,
+        chunk_size: int = CHUNK_SIZE,
+        retries: int = RETRIES
+) -> tuple[int, float]:
+    """
+    download url to filepath by several connections in parallel, each one
+    fetching a byte range, falls back to a single stream if the server does
+    not support Range requests, the range holding a corrupt frame is fetched
+    again, as is the rest of a range cut off
+    :param url: url of the media object
+    :param filepath: total file path of the download
+    :param connections: number of parallel connections
+    :param session: optional requests session to be reused
+    :param chunk_size: bytes read per iteration
+    :param retries: range requests of a corrupt range, and of the rest of
+    each range cut off
+    :return: tuple of bytes transferred and elapsed time in seconds
+    :raises requests.HTTPError: if the server responds with an error
+    :raises FrameError: if the media object is no valid mp3 stream
+    """
+    requester = session or default_session()
+    tmp_path = filepath + PART_SUFFIX
+    lock = Lock()
+
+    t_start = timeit.default_timer()
+    head = requester.head(url=url, allow_redirects=True)
+    head.raise_for_status()
+    length = int(head.headers.get('Content-Length', 0))
+    if head.headers.get('Accept-Ranges', '').lower() != 'bytes' \
+            or length < connections * chunk_size:
+        return stream_download(url=url,
+                               filepath=filepath,
+                               session=session,
+                               chunk_size=chunk_size,
+                               retries=retries)
+    etag = head.headers.get('ETag')
+    last_modified = head.headers.get('Last-Modified')
+    validator = etag or last_modified
+
+    journal = read_journal(filepath=filepath, url=url)
+    if not (journal
+            and 'done' in journal
+            and journal.get('length') == length
+            and journal.get('connections') == connections
+            and journal['bytes'] == length
+            and validator
+            and validator == (journal.get('etag')
+                              or journal.get('last_modified'))):
+        journal = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'length': length,
+            'connections': connections,  # the ranges depend on it
+            'done': []
+        }
+        with open(tmp_path, 'wb') as f:
+            f.truncate(length)  # preallocate
+    else:
+        print("Resuming {} with {} of {} ranges done".format(
+            url,
+            len(journal['done']),
+            connections))
+    write_journal(filepath=filepath, journal=journal)
+
+    bounds = [length * i // connections for i in range(connections + 1)]
+    ranges = [(start, end - 1) for start, end in zip(bounds, bounds[1:])
+              if start not in journal['done']]
+
+    # the range requests of the workers count for the download task
+    task = recorder.current()
+
+    def fetch_range(start: int, end: int) -> int:
+        written = 0
+        for attempt in range(retries + 1):
+            headers = {'Range': "bytes={}-{}".format(start + written, end)}
+            if validator:
+                headers['If-Range'] = validator
+            try:
+                with recorder.attached(task), \
+                        requester.get(url=url,
+                                      headers=headers,
+                                      stream=True) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RangeError(url)
+                    with open(tmp_path, 'r+b') as f:
+                        f.seek(start + written)
+                        for chunk in response.iter_content(
+                                chunk_size=chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+            except INCOMPLETE as e:
+                if attempt == retries:
+                    raise
+                print("{0}: range {1}-{2} {3}, fetching the rest".format(
+                    url, start, end, str(e)))
+                continue
+            break
+        if written != end - start + 1:
+            raise IOError("range {}-{} of {} incomplete".format(
+                start, end, url))
+        with lock:
+            journal['done'].append(start)
+            write_journal(filepath=filepath, journal=journal)
+        return written
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        futures = [pool.submit(fetch_range, *r) for r in ranges]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+    # the pool is shut down, no worker writes the partial file or journal
+    try:
+        size = sum(future.result() for future in futures
+                   if not future.cancelled())
+    except RangeError:
+        remove_journal(filepath=filepath)
+        return stream_download(url=url,
+                               filepath=filepath,
+                               session=session,
+                               chunk_size=chunk_size,
+                               retries=retries)
+
+    # the ranges start within frames, hence the file is validated as a whole
+    try:
+        with open(tmp_path, 'rb') as f:
+            validate(chunks=iter(partial(f.read, chunk_size), b""),
+                     content_length=length)
+    except FrameError as e:
+        if e.offset == 0 or retries <= 0:
+            if e.offset == 0:
+                remove_journal(filepath=filepath)
+            raise
+        print("{0}: {1}, fetching its range again".format(url, str(e)))
+        journal['done'] = [
+            start for start, end in zip(bounds, bounds[1:])
+            if start in journal['done'] and not start <= e.offset < end]
+        write_journal(filepath=filepath, journal=journal)
+        retried, _ = segmented_download(url=url,
+                                        filepath=filepath,
+                                        connections=connections,
+                                        session=session,
+                                        chunk_size=chunk_size,
+                                        retries=retries - 1)
+        return size + retried, timeit.default_timer() - t_start
+    elapsed = timeit.default_timer() - t_start
+
+    # rename is atomic, a reader never encounters a half written file
+    os.replace(tmp_path, filepath)
+    os.remove(filepath + JOURNAL_SUFFIX)
+
+    return size, elapsed
+
+
+def stream_downgrade(
+        url: str,
+        filepath: str,
+        factor: float,
+        session: requests.Session = None
+) -> tuple[int, float]:
+    """
+    download url and downgrade its bit rate while the bytes arrive, only the
+    downgraded mp3 is written to <file>.part and renamed on completion
+    :param url: url of the media object
+    :param filepath: total file path of the downgraded mp3
+    :param factor: multiplied with the bit rate of the media object
+    :param session: optional requests session to be reused
+    :return: tuple of bytes transferred and elapsed time in seconds
+    :raises requests.HTTPError: if the server responds with an error
+    """
+    if DOWNGRADER_PATH not in sys.path:
+        sys.path.append(DOWNGRADER_PATH)
+    from mp3_downgrade import downgrade_stream  # requires pymp3
+
+    getter = (session or default_session()).get
+    tmp_path = filepath + PART_SUFFIX
+
+    t_start = timeit.default_timer()
+    try:
+        with getter(url=url, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            reader = CountingReader(response.raw)
+            with open(tmp_path, 'wb') as f:
+                params = downgrade_stream(factor=factor,
+                                          read_file=reader,
+                                          write_file=f)
+        # rename is atomic, a reader never encounters a half written file
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    elapsed = timeit.default_timer() - t_start
+    print("{0} downgraded from {1} to {2} kb/second, {3} bytes".format(
+        filepath,
+        params['bit_rate'],
+        params['out_bit_rate'],
+        os.path.getsize(filepath)))
+
+    return reader.size, elapsed
+
+
+def download_mp3(
+        url: str,
+        filepath: str,
+        connections: int = 1,
+        session: requests.Session = None,
+        factor: float = None
+) -> tuple[int, float]:
+    """
+    download url to filepath, by a single stream or segmented, or downgraded
+    on the fly
+    :param url: url of the media object
+    :param filepath: total file path of the download
+    :param connections: number of parallel connections
+    :param session: optional requests session to be reused
+    :param factor: optional downgrade factor of the bit rate
+    :return: tuple of bytes transferred and elapsed time in seconds
+    """
+    if factor is not None:
+        return stream_downgrade(url=url,
+                                filepath=filepath,
+                                factor=factor,
+                                session=session)
+    if connections > 1:
+        return segmented_download(url=url,
+                                  filepath=filepath,
+                                  connections=connections,
+                                  session=session)
+    return stream_download(url=url,
+                           filepath=filepath,
+                           session=session)
+
+
+def output_name(
+        filepath: str,
+        counter: int
+) -> str:
+    """
+    file name of the n-th mp3 file on a page: file.mp3, file_1.mp3, ...
+    :param filepath: total file path of the first download
+    :param counter: position of the media object in the html scan
+    :return: total file path
+    """
+    return filepath if counter == 0 else "{0}_{1}.mp3".format(
+        filepath.rsplit(".", 1)[0],
+        counter
+    )
+
+
+def valid_mp3(
+        filepath: str
+) -> bool:
+    """
+    :param filepath: total file path
+    :return: True if the file is a complete mp3 stream
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            validate(chunks=iter(partial(f.read, CHUNK_SIZE), b""),
+                     content_length=os.path.getsize(filepath))
+        return True
+    except (OSError, FrameError):
+        return False
+
+
+def download_task(
+        mp3_url: str,
+        file_download: str,
+        connections: int = 1,
+        session: requests.Session = None,
+        index: DownloadIndex = None,
+        factor: float = None,
+        keep_existing: bool = False
+) -> int:
+    """
+    download one mp3 file and report the transfer, media objects archived
+    already according to the index are skipped, a downgraded output is no
+    copy of the media object, hence the index is bypassed
+    :param mp3_url: url of the media object
+    :param file_download: total file path of the download
+    :param connections: parallel connections per mp3 file
+    :param session: optional requests session to be reused
+    :param index: optional download index
+    :param factor: optional downgrade factor of the bit rate
+    :param keep_existing: a valid mp3 file_download counts as downloaded
+    :return: bytes transferred
+    :raises FileExistsError: if file_download exists
+    """
+    if factor is not None:
+        index = None
+    if index is not None \
+            and (archived := index.archived(audio_url=mp3_url)) is not None:
+        print("{0} archived already as {1}, skipping".format(
+            mp3_url,
+            archived))
+        return 0
+    if os.path.exists(file_download):
+        if keep_existing and valid_mp3(filepath=file_download):
+            print("{0} exists already as {1}, skipping".format(
+                mp3_url,
+                file_download))
+            return 0
+        raise FileExistsError(
+            "download file '{}' exists".format(file_download))
+
+    with recorder.task('download', url=mp3_url, file=file_download) as record:
+        size, elapsed = download_mp3(
+            url=mp3_url,
+            filepath=file_download,
+            connections=connections,
+            session=session,
+            factor=factor)
+        record['bytes'] = size
+    print("{1} downloaded to {0} successfully "
+          "({2} bytes in {3:.1f} s, {4})".format(
+        file_download,
+        mp3_url,
+        size,
+        elapsed,
+        throughput(size=size, elapsed=elapsed)
+    ))
+    if index is not None \
+            and (original := index.register(audio_url=mp3_url,
+                                            filepath=file_download)):
+        print("{0} is identical to {1}, hard linked".format(
+            file_download,
+            original))
+
+    return size
+
+
+def download_all(
+        mp3_urls: list[str],
+        filepath: str,
+        connections: int = 1,
+        workers: int = WORKERS,
+        session: requests.Session = None,
+        index: DownloadIndex = None,
+        factor: float = None
+) -> int:
+    """
+    download all mp3 files of a page concurrently
+    :param mp3_urls: urls of the media objects in order of the html scan
+    :param filepath: total file path of the first download
+    :param connections: parallel connections per mp3 file
+    :param workers: number of mp3 files downloaded simultaneously
+    :param session: optional requests session to be reused
+    :param index: optional download index
+    :param factor: optional downgrade factor of the bit rate
+    :return: exit code, 0: all downloaded, 1: all failed, 2: partial failure
+    """
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(download_task,
+                        mp3_url,
+                        output_name(filepath=filepath, counter=counter),
+                        connections,
+                        session,
+                        index,
+                        factor): mp3_url
+            for counter, mp3_url in enumerate(mp3_urls)
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print("Error: {0} - {1}".format(futures[future], str(e)))
+                failures += 1
+
+    return exit_code(failures=failures, total=len(mp3_urls))
+
+
+def exit_code(
+        failures: int,
+        total: int
+) -> int:
+    """
+    :param failures: number of failed downloads
+    :param total: number of downloads
+    :return: exit code, 0: all downloaded, 1: all failed, 2: partial failure
+    """
+    if failures == 0:
+        return 0
+    return 1 if failures == total else 2
+
+
+def throughput(
+        size: int,
+        elapsed: float
+) -> str:
+    """
+    human readable transfer rate
+    :param size: bytes transferred
+    :param elapsed: time in seconds
+    :return: rate string
+    """
+    rate = size / elapsed if elapsed > 0 else 0.
+    for unit in ("B/s", "kB/s", "MB/s"):
+        if rate < 1024. or unit == "MB/s":
+            return "{:.1f} {}".format(rate, unit)
+        rate /= 1024.
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+Structured timing of the scraper: every HTTP request, page scan and mp3
+download is recorded as an event with its phases, i.e. connect (DNS, TCP and
+TLS of a new connection), first byte, extraction resp. transfer, bytes and
+average rate. The events are written as JSON lines to a log stream and,
+optionally, collected for a machine-readable run report with percentiles
+per phase, e.g. to spot slow phases or a degrading CDN across many runs.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, TextIO
+
+# phases summarized in the run report by event
+PHASES = {
+    'request': ('connect_s', 'first_byte_s'),
+    'page': ('connect_s', 'first_byte_s', 'extract_s', 'seconds'),
+    'download': ('connect_s', 'first_byte_s', 'transfer_s', 'seconds',
+                 'rate_bps'),
+}
+
+
+def percentile(
+        values: list[float],
+        p: float
+) -> float:
+    """
+    :param values: sorted values
+    :param p: percentile in [0, 100]
+    :return: nearest rank percentile
+    """
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Recorder:
+    """
+    thread-safe recorder of the timing events, the request events of a
+    thread are attributed to the page scan or download running therein
+    """
+    def __init__(self) -> None:
+        self.stream: TextIO | None = None
+        self.events: list[dict] | None = None
+        self.started = time.time()
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def configure(
+            self,
+            stream: TextIO = None,
+            report: bool = False
+    ) -> None:
+        """
+        :param stream: JSON lines are written to, None disables the log
+        :param report: collect the events for the run report
+        :return: None
+        """
+        self.stream = stream
+        self.events = list() if report else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.stream is not None or self.events is not None
+
+    def emit(
+            self,
+            event: str,
+            **fields
+    ) -> None:
+        """
+        :param event: request, page, or download
+        :param fields: measurements
+        :return: None
+        """
+        if not self.enabled:
+            return
+        record = {'ts': round(time.time(), 3), 'event': event, **fields}
+        with self.__lock:
+            if self.stream is not None:
+                self.stream.write(json.dumps(record) + "\n")
+                self.stream.flush()
+            if self.events is not None:
+                self.events.append(record)
+
+    def current(self) -> dict:
+        """
+        :return: record of the page scan or download of this thread, a
+        dummy one outside of a task
+        """
+        return getattr(self.__local, 'task', None) or dict()
+
+    @contextmanager
+    def task(
+            self,
+            event: str,
+            **fields
+    ) -> Iterator[dict]:
+        """
+        time a page scan or download, the caller may add fields, e.g. bytes
+        :param event: page or download
+        :param fields: e.g. url
+        :return: record of the task
+        """
+        record = {**fields, 'requests': 0, 'connect_s': 0.,
+                  'first_byte_s': None}
+        previous = getattr(self.__local, 'task', None)
+        self.__local.task = record
+        record['_start'] = t_start = time.monotonic()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            self.__local.task = previous
+            del record['_start']
+            record['seconds'] = time.monotonic() - t_start
+            if record['first_byte_s'] is not None:
+                rest = record['seconds'] - record['first_byte_s']
+                if event == 'page':
+                    record['extract_s'] = rest
+                elif record.get('bytes'):
+                    record['transfer_s'] = rest
+                    record['rate_bps'] = record['bytes'] / rest \
+                        if rest > 0 else None
+            self.emit(event, **record)
+
+    @contextmanager
+    def attached(
+            self,
+            task: dict
+    ) -> Iterator[None]:
+        """
+        attribute the requests of this thread to a task started in another
+        thread, e.g. the range requests of a segmented download
+        :param task: record of the task, see current()
+        :return: None
+        """
+        previous = getattr(self.__local, 'task', None)
+        self.__local.task = task or None  # the dummy record is empty
+        try:
+            yield
+        finally:
+            self.__local.task = previous
+
+    def request_started(self) -> None:
+        self.__local.connect = 0.
+
+    def connected(
+            self,
+            seconds: float
+    ) -> None:
+        """
+        a new connection was opened for the request of this thread
+        :param seconds: DNS lookup, TCP and TLS handshake
+        :return: None
+        """
+        self.__local.connect = getattr(self.__local, 'connect', 0.) + seconds
+
+    def responded(
+            self,
+            method: str,
+            url: str,
+            seconds: float,
+            status: int = None,
+            attempt: int = 0,
+            error: str = None
+    ) -> None:
+        """
+        response headers of a request of this thread received or failed,
+        it counts for the task of the thread
+        :param method: GET or HEAD
+        :param url: requested url
+        :param seconds: from the start of the request to the headers
+        :param status: HTTP status
+        :param attempt: number of the retry
+        :param error: exception, if failed
+        :return: None
+        """
+        connect = getattr(self.__local, 'connect', 0.)
+        task = getattr(self.__local, 'task', None)
+        if task is not None:
+            with self.__lock:  # shared by the threads of a task
+                task['requests'] += 1
+                task['connect_s'] += connect
+                if task['first_byte_s'] is None and status is not None:
+                    task['first_byte_s'] = time.monotonic() - task['_start']
+        self.emit('request',
+                  method=method,
+                  url=url,
+                  status=status,
+                  attempt=attempt,
+                  connect_s=connect,
+                  **({'first_byte_s': seconds} if error is None
+                     else {'seconds': seconds, 'error': error}))
+
+    def report(self) -> dict:
+        """
+        :return: run report with the events and percentiles per phase
+        """
+        with self.__lock:
+            events = list(self.events or [])
+        summary = dict()
+        for event, phases in PHASES.items():
+            records = [e for e in events if e['event'] == event]
+            summary[event] = {'count': len(records),
+                              'failed': sum(1 for e in records
+                                            if e.get('error')
+                                            or (e.get('status') or 0) >= 400)}
+            for phase in phases:
+                values = sorted(e[phase] for e in records
+                                if e.get(phase) is not None)
+                if values:
+                    summary[event][phase] = {
+                        'mean': sum(values) / len(values),
+                        'p50': percentile(values, 50),
+                        'p95': percentile(values, 95),
+                        'max': values[-1]}
+        downloads = [e for e in events if e['event'] == 'download']
+        size = sum(e.get('bytes') or 0 for e in downloads)
+        wall = time.time() - self.started
+
+        return {
+            'started': self.started,
+            'wall_s': wall,
+            'bytes': size,
+            'rate_bps': size / wall if wall > 0 else None,
+            'summary': summary,
+            'events': events
+        }
+
+    def write_report(
+            self,
+            path: str
+    ) -> None:
+        """
+        :param path: file of the JSON run report
+        :return: None
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+recorder = Recorder()
+
+
+def timed(
+        event: str
+) -> Callable:
+    """
+    decorator recording each call of a function as task, its url argument
+    and the number of items returned are added to the event
+    :param event: page or download
+    :return: decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(url: str, *args, **kwargs):
+            with recorder.task(event, url=url) as record:
+                result = func(url, *args, **kwargs)
+                record['items'] = len(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""
+Watcher: polls WDR3 listing pages on a schedule, queues the concert player
+sites linked therein, and downloads their mp3 files with bounded concurrency
+and a delay between requests to the same host, before the recordings expire.
+The state of every concert player site found (new, done, failed) is kept
+in a SQLite database, hence a restarted watcher continues where it stopped.
+"""
+
+import html
+import os
+import re
+import signal
+import sqlite3
+import time
+import timeit
+from threading import Event, Lock
+from typing import Callable
+from urllib.parse import urljoin
+
+import requests
+
+from batch import PoliteSession, page_output, run_batch, summary
+from defaults import CONCURRENCY, DELAY, INTERVAL, STATE_FILE
+from download_index import DownloadIndex
+from stream_download import exit_code
+
+PLAYER_LINK = re.compile(r'href="([^"]*konzertplayer[^"]*\.html)"')
+MAX_ATTEMPTS = 5  # downloads of a site given up thereafter
+
+
+class WatchState:
+    """
+    SQLite backed state of the concert player sites found by the watcher
+    """
+    def __init__(self, path: str = STATE_FILE) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__lock = Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, "
+                "filepath TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'new', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "first_seen REAL NOT NULL, "
+                "last_try REAL)")
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_val, exc_tb): self.close()
+
+    def add(
+            self,
+            url: str,
+            filepath: str
+    ) -> bool:
+        """
+        :param url: url of the concert player site
+        :param filepath: total file path of its first download
+        :return: True if the site is new
+        """
+        with self.__lock, self.__db:
+            return self.__db.execute(
+                "INSERT OR IGNORE INTO pages (url, filepath, first_seen) "
+                "VALUES (?, ?, ?)",
+                (url, filepath, time.time())).rowcount == 1
+
+    def pending(
+            self,
+            max_attempts: int = MAX_ATTEMPTS
+    ) -> list[tuple[str, str]]:
+        """
+        :param max_attempts: sites failed this often are given up
+        :return: tuples of site url and file path to be downloaded
+        """
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT url, filepath FROM pages "
+                "WHERE status != 'done' AND attempts < ? "
+                "ORDER BY first_seen", (max_attempts,)).fetchall()
+
+    def update(
+            self,
+            url: str,
+            done: bool
+    ) -> None:
+        """
+        :param url: url of the concert player site
+        :param done: all mp3 files of the site downloaded
+        :return: None
+        """
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "UPDATE pages SET status = ?, attempts = attempts + 1, "
+                "last_try = ? WHERE url = ?",
+                ('done' if done else 'failed', time.time(), url))
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
+
+
+def player_links(
+        listing: str,
+        session: requests.Session,
+        link_pattern: re.Pattern = PLAYER_LINK
+) -> list[str]:
+    """
+    concert player sites linked on a listing page
+    :param listing: url of the listing page
+    :param session: session shared by all requests
+    :param link_pattern: regEx matching the href of a concert player site
+    :return: absolute urls without duplicates in order of appearance
+    """
+    r = session.get(url=listing)
+    r.raise_for_status()
+
+    return list(dict.fromkeys(
+        urljoin(listing, html.unescape(link))
+        for link in link_pattern.findall(r.text)))
+
+
+def watch(
+        listings: list[str],
+        extractor: Callable[..., list[str]],
+        state: WatchState,
+        directory: str = ".",
+        index: DownloadIndex = None,
+        link_pattern: re.Pattern = PLAYER_LINK,
+        interval: float = INTERVAL,
+        connections: int = 1,
+        concurrency: int = CONCURRENCY,
+        delay: float = DELAY,
+        once: bool = False,
+        stop: Event = None,
+        factor: float = None
+) -> int:
+    """
+    poll the listing pages and download the mp3 files of new concert player
+    sites until stopped by SIGINT/SIGTERM, the stop event, or after one poll,
+    valid mp3 files of a site in place from an earlier poll count as done
+    :param listings: urls of the listing pages
+    :param extractor: function(url, session) returning the mp3 urls of a site
+    :param state: persistent state of the sites found
+    :param directory: output directory
+    :param index: optional download index, skips archived media objects
+    :param link_pattern: regEx matching the href of a concert player site
+    :param interval: seconds between two polls
+    :param connections: parallel connections per mp3 file
+    :param concurrency: simultaneous page scans and mp3 downloads in total
+    :param delay: seconds between two requests to the same host
+    :param once: poll only once
+    :param stop: event terminating the watcher
+    :param factor: optional downgrade factor of the bit rate
+    :return: exit code of the last outcome per listing and site, 0: all
+    downloaded, 1: all failed, 2: partial failure
+    """
+    stop = stop or Event()
+    if not once:
+        # signal handlers can be installed in the main thread only
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+    outcomes: dict[str, dict] = dict()  # latest per listing and site
+    with PoliteSession(pool_size=concurrency * connections,
+                       delay=delay) as session:
+        while not stop.is_set():
+            for listing in listings:
+                try:
+                    links = player_links(listing=listing,
+                                         session=session,
+                                         link_pattern=link_pattern)
+                except Exception as e:
+                    print("Error: {0} - {1}".format(listing, str(e)))
+                    outcomes[listing] = {'error': True, 'files': 0,
+                                         'failed': 0}
+                    continue
+                outcomes.pop(listing, None)
+                new = [url for url in links
+                       if state.add(url=url,
+                                    filepath=page_output(url=url,
+                                                         directory=directory))]
+                print("{0} {1} new concert(s) on {2}".format(
+                    time.asctime(time.localtime()),
+                    len(new),
+                    listing))
+
+            if jobs := state.pending():
+                t_start = timeit.default_timer()
+                stats = run_batch(jobs=jobs,
+                                  extractor=extractor,
+                                  session=session,
+                                  connections=connections,
+                                  concurrency=concurrency,
+                                  index=index,
+                                  factor=factor,
+                                  keep_existing=True)
+                for url, s in stats.items():
+                    state.update(url=url,
+                                 done=not s['error'] and s['failed'] == 0)
+                outcomes.update(stats)
+                summary(stats=stats,
+                        wall_time=timeit.default_timer() - t_start)
+
+            if once or stop.wait(timeout=interval):
+                break
+
+    print("Watcher stopped.")
+
+    return exit_code(
+        failures=sum(s['failed'] + s['error'] for s in outcomes.values()),
+        total=sum(s['files'] + s['failed'] + s['error']
+                  for s in outcomes.values()))
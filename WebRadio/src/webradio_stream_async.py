@@ -11,10 +11,8 @@ import asyncio
 import os
 import random
 import time
-import timeit
-from queue import Queue
-from threading import Thread, Event
-from typing import Iterator, AsyncGenerator, TypeAlias
+from collections import deque
+from typing import Iterator, AsyncGenerator
 
 import aiofiles
 from fastapi import FastAPI, HTTPException
@@ -23,13 +21,12 @@ from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
 from starlette.requests import Request
 from tinytag import TinyTag
 
-C: TypeAlias = str | bytes  # workaround for aiofiles.read returning bytes instead of str when reading byte files
-evts = list()  # list of threads, queues, and events for subsequent cleansing
-
 ICY_METADATA_INTERVAL = 16 * 1024  # bytes
 ICY_BYTES_BLOCK_SIZE = 16  # bytes
 ZERO_BYTE = b"\0"
 TIME_INJECT = 60  # metadata injects in seconds
+LISTENER_QUEUE = 8  # chunks buffered per listener, the oldest dropped beyond
+BURST = 2  # most recent chunks sent at once to a new listener
 
 SOURCE_PATH = os.path.dirname(os.path.abspath(__file__))
 FAVICON_ICO = f"{SOURCE_PATH}/../img/favicon.png"
@@ -38,17 +35,6 @@ PATH = "/app/data/"  # where the mp3 reside inside docker
 if p := os.getenv("MP3_DIR"): PATH = p
 
 
-class MyMP3Reader:
-    """
-    Wrapper for aiofiles to circumvent a peculiarity of its implementation
-    of the __aexit__ method.
-    """
-    def __init__(self, file, mode) -> None:
-        self.file, self.mode = file, mode
-    async def __aenter__(self): return await aiofiles.open(self.file, self.mode)
-    async def __aexit__(self, exc_type, exc_val, exc_tb): pass
-
-
 def endless_generator(iterable: list[str]) -> Iterator[str]:
     """
     Endless generator that yields items from the iterable indefinitely.
@@ -144,34 +130,6 @@ def header(
     }
 
 
-def injector(
-        q: Queue,
-        event: Event,
-        msg: list
-) -> None:
-    """
-    Injector thread that puts a message into the queue every TIME_INJECT seconds.
-    This is used to inject metadata into the stream, i.e. StreamTitle
-    The thread will stop when the event is set. The queue will be cleaned up
-    at the end of the thread.
-    :param q: Queue to put the messages into
-    :param event: Event to stop the thread
-    :param msg: list of messages to be injected into the stream, one after
-    another
-    :return: None
-    """
-    streaming_title: Iterator[str] = endless_generator(iterable=msg)
-    while True:
-        if event.is_set(): break
-        if q.empty(): q.put(next(streaming_title))
-        time.sleep(TIME_INJECT)
-    # clean up the queue, there should be only one item left
-    if not q.empty():
-        q.get_nowait()
-        q.task_done()
-    print("Stopping thread ... killing the zombie!")
-
-
 def preprocess_metadata(
         metadata: str = "META_EVENT"
 ) -> bytes:
@@ -203,93 +161,174 @@ def preprocess_metadata(
     return r
 
 
-async def iterfile_mod(
-        path: str,
-        request: Request = None,
-        msg: list = None,
-        bitrate: float = None,
+class Station:
+    """
+    One broadcast for all listeners: a single producer task reads the mp3
+    files one after another, paces them by their bitrate and fans the chunks
+    out to bounded per-listener queues, hence file reads and timers do not
+    grow with the number of listeners. The chunks are of exactly
+    ICY_METADATA_INTERVAL bytes, also across files, thus metadata may be
+    injected after each chunk. A listener lagging behind loses its oldest
+    chunks instead of holding up the others. The broadcast pauses when the
+    last listener has left.
+    The metadata rotation is scheduled by the producer as well: at the
+    start of each song and every TIME_INJECT seconds the next message is
+    attached to the chunk, formatted once for all listeners.
+    """
+    def __init__(self, playlist: Iterator[str]) -> None:
+        self.playlist = playlist
+        self.listeners: set[asyncio.Queue] = set()
+        self.recent: deque[tuple[bytes, bytes | None]] = deque(maxlen=BURST)
+        self.meta: dict = dict()
+        self.messages: Iterator[str] = iter(())
+        self.metadata = preprocess_metadata(metadata="")  # injected last
+        self.t_inject = 0.  # event loop time of the next injection
+        self.task: asyncio.Task | None = None
+
+    def next_song(self) -> str:
+        """
+        :return: path of the next mp3 file, its metadata are made current
+        :raises StopIteration: if the playlist is exhausted
+        """
+        item = next(self.playlist)
+        self.meta = mp3_metadata(filepath=item)
+        print("metadata: {}".format(self.meta))
+        self.messages = endless_generator(iterable=[
+            f"Title: {self.meta.get('title', "unknown")}",
+            f"Album: {self.meta.get('album', "unknown")}",
+            f"Artist: {self.meta.get('artist', "unknown")}"
+        ])
+        self.t_inject = 0.  # at the first chunk of the song
+        print("{0} Currently playing: {1}".format(
+            time.asctime(time.localtime()),
+            item))
+
+        return item
+
+    def start(self) -> None:
+        """
+        start the broadcast with the next song, unless on air
+        """
+        if self.task is None:
+            self.recent.clear()
+            self.task = asyncio.create_task(self.broadcast(self.next_song()))
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        :return: queue of the chunks and their metadata for a new listener,
+        starting with the most recent ones
+        """
+        queue = asyncio.Queue(maxsize=LISTENER_QUEUE)
+        for item in self.recent:
+            queue.put_nowait(item)
+        self.listeners.add(queue)
+        self.start()
+
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.listeners.discard(queue)
+
+    def inject(self, now: float) -> bytes | None:
+        """
+        :param now: event loop time
+        :return: ICY metadata of the next message if due, None otherwise
+        :raises RuntimeError: if the number of blocks exceeds 255
+        """
+        if now < self.t_inject:
+            return None
+        self.t_inject = now + TIME_INJECT
+        self.metadata = preprocess_metadata(metadata=next(self.messages))
+
+        return self.metadata
+
+    def publish(self, item: tuple[bytes, bytes | None] | None) -> None:
+        """
+        :param item: chunk and its metadata to all listeners, None ends
+        their streams
+        """
+        if item is not None:
+            self.recent.append(item)
+        for queue in self.listeners:
+            if queue.full():  # listener lags behind, drop its oldest chunk
+                queue.get_nowait()
+            queue.put_nowait(item)
+
+    async def broadcast(self, item: str) -> None:
+        """
+        producer task, reads and paces the stream once for all listeners
+        :param item: path to the first mp3 file
+        """
+        loop = asyncio.get_running_loop()
+        t_next = loop.time()
+        rest = b""  # tail of the previous file, short of a chunk
+        try:
+            while True:
+                byte_rate = self.meta.get('bitrate') * 1000 / 8
+                mp3_stream = await aiofiles.open(item, mode="rb")
+                try:
+                    while chunk := await mp3_stream.read(
+                            ICY_METADATA_INTERVAL - len(rest)):
+                        chunk, rest = rest + chunk, b""
+                        if len(chunk) < ICY_METADATA_INTERVAL:
+                            rest = chunk
+                            continue
+                        self.publish((chunk, self.inject(loop.time())))
+                        t_next += ICY_METADATA_INTERVAL / byte_rate
+                        delay = t_next - loop.time()
+                        if delay < 0:  # fell behind, e.g. slow disk
+                            t_next, delay = loop.time(), 0.
+                        await asyncio.sleep(delay)
+                        if not self.listeners:
+                            break
+                finally:
+                    await mp3_stream.close()
+                if not self.listeners:
+                    print("Broadcast paused, no listeners left")
+                    self.task = None
+                    return
+                item = self.next_song()
+        except Exception as e:
+            print(f"Broadcast stopped: {e}")
+            self.publish(None)
+            self.task = None
+
+
+async def listen(
+        station: Station,
+        request: Request
 ) -> AsyncGenerator[bytes, None]:
     """
-    Generator that yields chunks of the mp3 file. If the flag is set, it will
-    also yield metadata. The stream is delayed by a retention time, depending on
-    the bitrate and the ICY_METADATA_INTERVAL.
-    :param path: path to the mp3 file
+    Generator that yields the chunks of the station's broadcast to one
+    listener. If the flag is set, it will also yield metadata after each
+    chunk, the current message right away.
+    :param station: broadcast to listen to
     :param request: client request, used to identify the client
-    :param msg: msg to be injected into the stream
-    :param bitrate: bitrate of the mp3 file in kBits/s
     :return: Iterator[bytes] for StreamingResponse
-    :raises RuntimeError: if the number of blocks exceeds 255
-    :raises ValueError: if the retention time - in case the stream is paused
-    by the client - becomes negative, i.e. discontinues the byte stream
-    :raises HTTPException: if the file is not found or any other error occurs
     """
-    chunk: C
-    retention = ICY_METADATA_INTERVAL / (bitrate * 1000 / 8)
-    correction = 0.
-    t_total = 0.
-
-    if flag := request.headers.get('icy-metadata') == '1':
-        q = Queue()
-        event = Event()
-        t = Thread(
-            target=injector,
-            args=(q, event, msg,))
-        t.start()
-
-        if evts:
-            print("Items in thread list (Event: 'is set' will be deleted):")
-            for item in evts:
-                print(item)
-        for v in filter(lambda person: person['client'] ==
-                                       request.headers['user-agent'], evts):
-            v['event'].set()
-            if not v['thread'].is_alive():
-                v['thread'].join()
-                v['queue'].join()
-                # delete all inactive instances
-                del v['event']
-                del v['queue']
-                del v['thread']
-                evts.remove(v)  # remove old items from list
-        evts.append(  # append current thread, queue and event
-            {
-                'client': request.headers['user-agent'],
-                'thread': t,
-                'queue': q,
-                'event': event
-            })
-
-    async with MyMP3Reader(
-            file=path,
-            mode="rb") as mp3_stream:
-        t_start = timeit.default_timer()
-        while chunk := await mp3_stream.read(ICY_METADATA_INTERVAL):
-            yield chunk
-
-            if flag:
-                if q.empty():
-                    yield ZERO_BYTE
-                else:  # get a special signal we can send some metadata
-                    streaming_title = q.get_nowait()
-                    q.task_done()
-                    yield preprocess_metadata(metadata=streaming_title)
-                delay = retention - correction
-                if delay < 0: delay = retention
-                try:
-                    await asyncio.sleep(delay=delay)
-                except asyncio.CancelledError:
-                    print(f"CancelledError: Streaming interrupted by client: "
-                          f"{request.headers['user-agent']}.")
-                    break
-                # print(await request.is_disconnected())
-                t_total += retention
-                correction = timeit.default_timer() - t_start - t_total
-                # print(correction, timeit.default_timer() - t_start, t_total)
+    flag = request.headers.get('icy-metadata') == '1'
+    chunks = station.subscribe()
+    first = True
+    try:
+        while (item := await chunks.get()) is not None:
+            chunk, metadata = item
+            if not flag:
+                yield chunk
+                continue
+            if metadata is None and first:
+                metadata = station.metadata
+            first = False
+            yield chunk + (metadata or ZERO_BYTE)
+    except asyncio.CancelledError:
+        print(f"CancelledError: Streaming interrupted by client: "
+              f"{request.headers['user-agent']}.")
+    finally:
+        station.unsubscribe(chunks)
 
     print(f"Streaming ended for {request.headers['user-agent']}")
 
 
-eternal_iterator: Iterator[str] = endless_generator(iterable=file_shuffle())
+station = Station(playlist=endless_generator(iterable=file_shuffle()))
 
 app = FastAPI(
     docs_url=None,
@@ -306,31 +345,18 @@ async def post_media_stream(request: Request):
     print("/api/webradio caller: ", request.headers)
 
     try:
-        while True:
-            item = next(eternal_iterator)
-            meta = mp3_metadata(filepath=item)
-            print("metadata: {}".format(meta))
-            msg = [
-                f"Title: {meta.get('title', "unknown")}",
-                f"Album: {meta.get('album', "unknown")}",
-                f"Artist: {meta.get('artist', "unknown")}"
-            ]
-            print("{0} Currently playing: {1}".format(
-                time.asctime(time.localtime()),
-                item))
-            headers: dict = header(meta=meta)
-            if request.headers.get('icy-metadata') == '1':
-                # enhance headers by ICY_METADATA_INTERVAL
-                headers['icy-metaint'] = str(ICY_METADATA_INTERVAL)
-
-            return StreamingResponse(
-                content=iterfile_mod(
-                    path=item,
-                    request=request,
-                    msg=msg,
-                    bitrate=meta.get('bitrate')),
-                media_type="audio/mpeg",
-                headers=headers)
+        station.start()  # on air with the current song
+        headers: dict = header(meta=station.meta)
+        if request.headers.get('icy-metadata') == '1':
+            # enhance headers by ICY_METADATA_INTERVAL
+            headers['icy-metaint'] = str(ICY_METADATA_INTERVAL)
+
+        return StreamingResponse(
+            content=listen(
+                station=station,
+                request=request),
+            media_type="audio/mpeg",
+            headers=headers)
 
     except StopIteration:
         raise HTTPException(
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the mp3 url extraction: fast path byte scan vs. full parse of
+the html soup by BeautifulSoup. Saved concert player pages are given as
+arguments, otherwise a synthetic page is generated:
+
+$ python3 benchmarks/extract.py [-n repeat] [<page>.html ...]
+"""
+
+import os
+import re
+import sys
+import timeit
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..",
+    "WDR3_concert_downloader"))
+
+from bs4 import BeautifulSoup
+
+from concert_downloader1 import PATTERN
+from fast_extract import CHUNK_SIZE, scan_chunks
+
+
+def synthetic_page(
+        blocks: int = 3,
+        filler: int = 300 * 1024
+) -> bytes:
+    """
+    html page resembling a concert player site
+    :param blocks: number of media blocks
+    :param filler: bytes of markup and scripts without media
+    :return: html page
+    """
+    script = ('<script>globalObject.gseaInlineMediaData["mdb-{0}"] = '
+              '{{"mediaType":"audio","mediaResource":{{"dflt":'
+              '{{"audioURL":"//wdrmedien-a.akamaihd.net/medp/ondemand/'
+              'weltweit/fsk0/{0}/{0}_1.mp3","mediaFormat":"mp3"}}}}}};'
+              '</script>\n')
+    noise = ('<div class="teaser"><a href="/radio/wdr3/x.html">Teaser</a>'
+             '<script>var tracking = {"id": 4711};</script></div>\n')
+    half = noise * (filler // len(noise) // 2)
+    page = ("<html><head><title>WDR 3 Konzert</title></head><body>\n"
+            + half
+            + "".join(script.format(300000 + i) for i in range(blocks))
+            + half
+            + "</body></html>\n")
+
+    return page.encode()
+
+
+def soup_extract(page: bytes) -> list[str]:
+    soup = BeautifulSoup(page.decode(), "html.parser")
+    return [re.findall(PATTERN, script.text)[0]
+            for script in soup.find_all('script', string=PATTERN)]
+
+
+def fast_extract(page: bytes) -> list[str]:
+    chunks = (page[i:i + CHUNK_SIZE]
+              for i in range(0, len(page), CHUNK_SIZE))
+    return scan_chunks(chunks=chunks)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark of the mp3 url extraction")
+    parser.add_argument('-n', '--repeat', default=20, type=int,
+                        help='repetitions per page (default: 20)')
+    parser.add_argument('pages', nargs='*', help='saved html pages')
+    pargs = parser.parse_args()
+
+    pages = {name: open(name, 'rb').read() for name in pargs.pages} \
+        or {"synthetic": synthetic_page()}
+    print("{:<40} {:>8} {:>6} {:>12} {:>12} {:>8}".format(
+        "page", "kB", "urls", "soup [ms]", "fast [ms]", "speedup"))
+    for name, page in pages.items():
+        if soup_extract(page) != fast_extract(page):
+            print("Warning: results differ for {}".format(name))
+        t_soup = timeit.timeit(lambda: soup_extract(page),
+                               number=pargs.repeat) / pargs.repeat
+        t_fast = timeit.timeit(lambda: fast_extract(page),
+                               number=pargs.repeat) / pargs.repeat
+        print("{:<40} {:>8.0f} {:>6} {:>12.2f} {:>12.2f} {:>7.0f}x".format(
+            os.path.basename(name)[-40:],
+            len(page) / 1024,
+            len(fast_extract(page)),
+            t_soup * 1e3,
+            t_fast * 1e3,
+            t_soup / t_fast))
+
+
+if __name__ == '__main__':
+    main()
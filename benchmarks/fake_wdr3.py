@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in of the WDR3 web site and its media server for load tests and
+benchmarks. Concert player pages are rendered from the html fixture, their
+media blocks point to synthetic mp3 files of valid MPEG frames, which are
+generated on the fly for any size and byte range. Latency, bandwidth per
+connection, Range support and injected failures are configurable:
+
+$ python3 benchmarks/fake_wdr3.py [--port N] [--pages N] [--media N]
+  [--size MB] [--latency sec] [--bandwidth MB/s] [--no-range]
+  [--fail RATE] [--cut RATE] [--corrupt RATE] [--seed N]
+
+The pages are http://127.0.0.1:N/radio/wdr3/programm/sendungen/wdr3-konzert/
+konzertplayer-<n>.html, linked from the listing page index.html therein.
+"""
+
+import os
+import random
+import re
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+FIXTURE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                       "fixtures", "konzertplayer.html")
+SECTION = "/radio/wdr3/programm/sendungen/wdr3-konzert/"
+PAGE_PATH = re.compile(re.escape(SECTION) + r"konzertplayer-(\d+)\.html$")
+MEDIA_PATH = re.compile(r"/medp/ondemand/weltweit/fsk0/\d+/(\d+)/\1_(\d+)\.mp3$")
+MEDIA_BLOCK = (
+    '<script>\n'
+    'globalObject.gseaInlineMediaData["mdb-{id}"] = {{"mediaType":"audio",'
+    '"mediaVersion":"1.4.0","trackerData":{{"trackerClipId":{id}}},'
+    '"mediaResource":{{"dflt":{{"mediaFormat":"mp3","audioURL":'
+    '"//{host}/medp/ondemand/weltweit/fsk0/{dir}/{id}/{id}_{n}.mp3"}}}}}};\n'
+    '</script>')
+FILLER = ('<article class="teaser"><h2>Weitere Konzerte</h2>'
+          '<p>Lorem ipsum dolor sit amet, consectetur adipisici elit, sed '
+          'eiusmod tempor incidunt ut labore et dolore magna aliqua.</p>'
+          '</article>\n')
+# MPEG-1 layer III, 128 kb/second, 44.1 kHz, joint stereo: 417 bytes/frame
+FRAME = bytes.fromhex("fffb9064") + bytes(413)
+BLOCK = 64 * 1024  # bytes written at once
+LAST_MODIFIED = "Sat, 01 Mar 2025 20:04:00 GMT"
+
+
+class FakeWDR3(ThreadingHTTPServer):
+    """
+    threading http server holding the configuration of the stand-in
+    """
+    daemon_threads = True
+
+    def __init__(
+            self,
+            port: int = 0,
+            pages: int = 10,
+            media: int = 1,
+            size: float = 10.,
+            filler: int = 200,
+            latency: float = 0.,
+            bandwidth: float = 0.,
+            ranges: bool = True,
+            fail: float = 0.,
+            cut: float = 0.,
+            corrupt: float = 0.,
+            seed: int = 0
+    ) -> None:
+        """
+        :param port: 0 picks a free port
+        :param pages: number of concert player pages
+        :param media: mp3 files per page
+        :param size: MB per mp3 file
+        :param filler: kB of markup padding each page
+        :param latency: seconds before the response headers
+        :param bandwidth: MB/second per connection, 0 unlimited
+        :param ranges: Range requests supported
+        :param fail: rate of requests answered by 503
+        :param cut: rate of mp3 responses cut off halfway
+        :param corrupt: rate of mp3 responses with a garbage block
+        :param seed: of the failure injection
+        """
+        super().__init__(("127.0.0.1", port), Handler)
+        self.pages, self.media = pages, media
+        # whole frames, hence the duration check of the validator passes
+        self.size = int(size * 1024 ** 2) // len(FRAME) * len(FRAME)
+        with open(FIXTURE, "r") as f:
+            self.fixture = f.read()
+        self.filler = FILLER * (filler * 1024 // len(FILLER))
+        self.latency, self.bandwidth, self.ranges = latency, bandwidth, ranges
+        self.fail, self.cut, self.corrupt = fail, cut, corrupt
+        self.__random = random.Random(seed)
+        self.__lock = Lock()
+        self.requests = 0
+        self.sending = self.peak = 0  # mp3 bodies in transfer, maximum
+
+    def sent(self, delta: int) -> None:
+        """
+        count a mp3 body starting (+1) or finished (-1)
+        :param delta: change of the bodies in transfer
+        :return: None
+        """
+        with self.__lock:
+            self.sending += delta
+            self.peak = max(self.peak, self.sending)
+
+    @property
+    def base_url(self) -> str:
+        return "http://{0}:{1}".format(*self.server_address)
+
+    def page_urls(self) -> list[str]:
+        return ["{0}{1}konzertplayer-{2}.html".format(
+            self.base_url, SECTION, i) for i in range(self.pages)]
+
+    def chance(self, rate: float) -> bool:
+        with self.__lock:
+            self.requests += 1
+            return rate > 0 and self.__random.random() < rate
+
+    def page(self, i: int) -> bytes:
+        host = "{0}:{1}".format(*self.server_address)
+        media_id = 3000000 + i
+        blocks = "\n".join(
+            MEDIA_BLOCK.format(id=media_id, host=host, dir=media_id // 10000,
+                               n=n + 1)
+            for n in range(self.media))
+        return (self.fixture
+                .replace("@@MEDIA@@", blocks)
+                .replace("@@FILLER@@", self.filler)
+                .replace("@@TITLE@@", "Konzert Nr. {}".format(i))
+                .replace("@@ID@@", str(media_id))).encode()
+
+    def listing(self) -> bytes:
+        links = "\n".join('<a href="konzertplayer-{0}.html">Konzert {0}</a>'
+                          .format(i) for i in range(self.pages))
+        return "<html><body>\n{}\n</body></html>".format(links).encode()
+
+    def start(self) -> Thread:
+        thread = Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def media_bytes(
+        start: int,
+        end: int
+) -> bytes:
+    """
+    :param start: first byte
+    :param end: byte after the last one
+    :return: bytes of the synthetic mp3 file
+    """
+    first = start // len(FRAME)
+    count = -(-end // len(FRAME)) - first
+    offset = start - first * len(FRAME)
+
+    return (FRAME * count)[offset:offset + end - start]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeWDR3
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self.do_GET(body=False)
+
+    def do_GET(self, body: bool = True) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.chance(self.server.fail):
+            return self.reply(503, b"", {"Retry-After": "0"})
+        if self.path == SECTION + "index.html":
+            return self.reply(200, self.server.listing(), body=body)
+        if (m := PAGE_PATH.match(self.path)) \
+                and int(m[1]) < self.server.pages:
+            etag = '"page-{}"'.format(m[1])
+            if self.headers.get("If-None-Match") == etag:
+                return self.reply(304, b"", {"ETag": etag})
+            return self.reply(200, self.server.page(int(m[1])),
+                              {"ETag": etag, "Content-Type": "text/html"},
+                              body=body)
+        if (m := MEDIA_PATH.match(self.path)) \
+                and int(m[2]) <= self.server.media:
+            return self.media(etag='"{0}-{1}"'.format(m[1], m[2]), body=body)
+        self.reply(404, b"not found")
+
+    def reply(
+            self,
+            status: int,
+            data: bytes,
+            headers: dict = None,
+            body: bool = True
+    ) -> None:
+        self.send_response(status)
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def media(
+            self,
+            etag: str,
+            body: bool
+    ) -> None:
+        size = self.server.size
+        start, end = 0, size
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if self.server.ranges and range_header \
+                and if_range in (None, etag, LAST_MODIFIED):
+            m = re.match(r"bytes=(\d+)-(\d*)$", range_header)
+            start = int(m[1])
+            end = int(m[2]) + 1 if m[2] else size
+            if start >= size:
+                return self.reply(416, b"",
+                                  {"Content-Range": "bytes */{}".format(size)})
+            end = min(end, size)
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(
+                start, end - 1, size))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if not body:
+            return
+
+        stop = start + (end - start) // 2 \
+            if self.server.chance(self.server.cut) else end
+        garbage = start + (end - start) // 3 \
+            if self.server.chance(self.server.corrupt) else None
+        t_start = time.monotonic()
+        sent = 0
+        self.server.sent(1)
+        try:
+            for pos in range(start, stop, BLOCK):
+                data = media_bytes(pos, min(pos + BLOCK, stop))
+                if garbage is not None and pos <= garbage < pos + len(data):
+                    data = data[:garbage - pos] \
+                        + bytes(len(data) - garbage + pos)
+                    garbage = None
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                sent += len(data)
+                if self.server.bandwidth:
+                    ahead = sent / (self.server.bandwidth * 1024 ** 2) \
+                            - (time.monotonic() - t_start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        finally:
+            self.server.sent(-1)
+        if stop < end:
+            self.close_connection = True
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Local stand-in of the WDR3 site")
+    parser.add_argument('--port', default=8000, type=int,
+                        help='port (default: 8000)')
+    parser.add_argument('--pages', default=10, type=int,
+                        help='concert player pages (default: 10)')
+    parser.add_argument('--media', default=1, type=int,
+                        help='mp3 files per page (default: 1)')
+    parser.add_argument('--size', default=10., type=float,
+                        help='MB per mp3 file (default: 10)')
+    parser.add_argument('--filler', default=200, type=int,
+                        help='kB of markup per page (default: 200)')
+    parser.add_argument('--latency', default=0., type=float,
+                        help='seconds before each response (default: 0)')
+    parser.add_argument('--bandwidth', default=0., type=float,
+                        help='MB/s per connection, 0 unlimited (default: 0)')
+    parser.add_argument('--no-range', action='store_true',
+                        help='ignore Range requests')
+    parser.add_argument('--fail', default=0., type=float,
+                        help='rate of 503 responses (default: 0)')
+    parser.add_argument('--cut', default=0., type=float,
+                        help='rate of mp3 responses cut off (default: 0)')
+    parser.add_argument('--corrupt', default=0., type=float,
+                        help='rate of corrupt mp3 responses (default: 0)')
+    parser.add_argument('--seed', default=0, type=int,
+                        help='seed of the failure injection (default: 0)')
+    pargs = parser.parse_args()
+
+    server = FakeWDR3(port=pargs.port,
+                      pages=pargs.pages,
+                      media=pargs.media,
+                      size=pargs.size,
+                      filler=pargs.filler,
+                      latency=pargs.latency,
+                      bandwidth=pargs.bandwidth,
+                      ranges=not pargs.no_range,
+                      fail=pargs.fail,
+                      cut=pargs.cut,
+                      corrupt=pargs.corrupt,
+                      seed=pargs.seed)
+    print("Serving {0} pages on {1}{2}index.html".format(
+        pargs.pages, server.base_url, SECTION), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the cold start of the downloader: the command line is run in
+a fresh interpreter with -X importtime, the cumulative import time is
+compared with a budget, and the heavy dependencies must not be loaded before
+the arguments are parsed and the url is validated. The exit code is 1 if
+the budget is exceeded or a heavy module was imported, hence the script may
+serve as a regression check:
+
+$ python3 benchmarks/importtime.py [-n repeat] [--budget ms] [--top N]
+"""
+
+import os
+import re
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+DOWNLOADER = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..",
+    "WDR3_concert_downloader")
+BUDGET = 50.  # ms
+# interpreter start up, depends on the .pth files of the site-packages
+STARTUP = ("site",)
+# not to be imported by -h or a rejected url
+HEAVY = ("requests", "bs4", "js2py_", "pydantic", "urllib3", "mp3")
+# command lines finishing before any download
+RUNS = {
+    "help": ["-h"],
+    "invalid url": ["https://example.com/concert.html"],
+}
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def import_times(
+        args: list[str]
+) -> dict[str, tuple[int, int]]:
+    """
+    run the downloader in a fresh interpreter with -X importtime
+    :param args: command line arguments
+    :return: self and cumulative import time in us by top level module,
+    except the interpreter start up
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", DOWNLOADER] + args,
+        capture_output=True,
+        text=True)
+    times = dict()
+    for match in LINE.finditer(result.stderr):
+        # top level imports only, they include the nested
+        if not match[3] and match[4] not in STARTUP:
+            times[match[4]] = int(match[1]), int(match[2])
+
+    return times
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark of the cold start")
+    parser.add_argument('-n', '--repeat', default=5, type=int,
+                        help='runs per command line, the fastest counts '
+                             '(default: 5)')
+    parser.add_argument('--budget', default=BUDGET, type=float,
+                        help='cumulative import time in ms '
+                             '(default: {})'.format(BUDGET))
+    parser.add_argument('--top', default=5, type=int,
+                        help='slowest imports listed (default: 5)')
+    pargs = parser.parse_args()
+
+    failed = False
+    for name, args in RUNS.items():
+        runs = [import_times(args=args) for _ in range(max(1, pargs.repeat))]
+        totals = [sum(c for _, c in times.values()) / 1e3 for times in runs]
+        best = runs[totals.index(min(totals))]
+        heavy = sorted({module.split(".")[0] for module in best} & set(HEAVY))
+        over = min(totals) > pargs.budget
+        failed |= over or bool(heavy)
+        print("{0:<12} {1:>8.1f} ms (budget {2:.0f} ms) {3}".format(
+            name, min(totals), pargs.budget, "FAIL" if over else "ok"))
+        for module, (_, cumulative) in sorted(
+                best.items(), key=lambda item: -item[1][1])[:pargs.top]:
+            print("    {0:<30} {1:>8.1f} ms".format(module, cumulative / 1e3))
+        if heavy:
+            print("    heavy modules imported: {}".format(", ".join(heavy)))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
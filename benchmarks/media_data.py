@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the media data parser: JSON decoding of the object literal
+assigned to globalObject.gseaInlineMediaData vs. evaluation by the js2py
+JavaScript interpreter. Script blocks are taken from saved concert player
+pages given as arguments, otherwise a synthetic script is generated:
+
+$ python3 benchmarks/media_data.py [-n repeat] [<page>.html ...]
+"""
+
+import os
+import sys
+import timeit
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..",
+    "WDR3_concert_downloader"))
+
+from concert_downloader_js import eval_media_data, parse_media_data
+from fast_extract import scan_scripts
+
+SCRIPT = """
+globalObject.gseaInlineMediaData = globalObject.gseaInlineMediaData || {};
+globalObject.gseaInlineMediaData["mdb-3000001"] = {
+    "mediaType": "audio",
+    "mediaVersion": "1.4.0",
+    "trackerData": {"trackerClipTitle": "WDR 3 Konzert", "trackerClipId": 1},
+    "mediaResource": {
+        "dflt": {"mediaFormat": "mp3", "audioURL":
+            "//wdrmedien-a.akamaihd.net/medp/ondemand/weltweit/fsk0/300/3000001/3000001_1.mp3"},
+        "alt": {"mediaFormat": "mp3", "audioURL":
+            "//wdrmedien-a.akamaihd.net/medp/ondemand/weltweit/fsk0/300/3000001/3000001_2.mp3"}
+    }
+};
+"""
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark of the media data parser")
+    parser.add_argument('-n', '--repeat', default=20, type=int,
+                        help='repetitions per script (default: 20)')
+    parser.add_argument('pages', nargs='*', help='saved html pages')
+    pargs = parser.parse_args()
+
+    scripts = [
+        script.decode(errors="replace")
+        for name in pargs.pages
+        for script in scan_scripts(chunks=[open(name, 'rb').read()])
+    ] or [SCRIPT]
+    print("{:>6} {:>8} {:>12} {:>12} {:>8}".format(
+        "script", "chars", "json [ms]", "js2py [ms]", "speedup"))
+    for i, script in enumerate(scripts):
+        t_json = timeit.timeit(lambda: parse_media_data(script=script),
+                               number=pargs.repeat) / pargs.repeat
+        try:
+            eval_media_data(script=script)  # loads the interpreter lazily
+            t_js = timeit.timeit(lambda: eval_media_data(script=script),
+                                 number=pargs.repeat) / pargs.repeat
+        except Exception as e:
+            print("Warning: js2py failed on script {0}: {1}".format(i, e))
+            continue
+        print("{:>6} {:>8} {:>12.3f} {:>12.3f} {:>7.0f}x".format(
+            i, len(script), t_json * 1e3, t_js * 1e3, t_js / t_json))
+
+
+if __name__ == '__main__':
+    main()
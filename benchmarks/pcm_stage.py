@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the PCM preprocessing of the mp3 downgrader: throughput of the
+NumPy downmix and resampler per variant, compared with the time the encoder
+takes for the preprocessed audio. The PCM data is decoded from a mp3 file
+given as argument, otherwise a synthetic stereo signal is generated:
+
+$ python3 benchmarks/pcm_stage.py [-n repeat] [-b kbps] [--seconds s] [<file>.mp3]
+"""
+
+import os
+import sys
+import timeit
+from argparse import ArgumentParser
+from io import BytesIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "MP3_downgrader"))
+
+import mp3  # pymp3
+
+from mp3_downgrade import DEFAULT_PRESET, PCM_CHUNK, PRESETS, encode_segment
+from pcm import preprocess
+
+# label, downmix to mono, output sample rate (None keeps the input's)
+VARIANTS = (
+    ("none", False, None),
+    ("mono", True, None),
+    ("32000", False, 32000),
+    ("22050", False, 22050),
+    ("mono 22050", True, 22050),
+    ("mono 16000", True, 16000),
+)
+
+
+def synthetic(
+        seconds: float,
+        sample_rate: int = 44100
+) -> bytes:
+    """
+    :param seconds: duration
+    :param sample_rate: samples/second
+    :return: interleaved stereo PCM data of a chirp and noise
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    rng = np.random.default_rng(0)
+    left = np.sin(2 * np.pi * (200 + 400 * t) * t)
+    right = 0.3 * rng.standard_normal(len(t))
+
+    return (np.stack([left, right], axis=1) * 12000).astype("<i2").tobytes()
+
+
+def decode(
+        filepath: str
+) -> tuple[bytes, int, int]:
+    """
+    :param filepath: mp3 file
+    :return: PCM data, channels, and sample rate
+    """
+    with open(filepath, "rb") as read_file:
+        decoder = mp3.Decoder(read_file)
+        out = BytesIO()
+        while pcm_data := decoder.read(PCM_CHUNK):
+            out.write(pcm_data)
+
+        return out.getvalue(), decoder.get_channels(), \
+            decoder.get_sample_rate()
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark of the PCM preprocessing")
+    parser.add_argument('-n', '--repeat', default=3, type=int,
+                        help='repetitions of the preprocessing (default: 3)')
+    parser.add_argument('-b', '--bitrate', default=64, type=int,
+                        help='bit rate of the encoder in kb/second '
+                             '(default: 64)')
+    parser.add_argument('--seconds', default=60., type=float,
+                        help='duration of the synthetic signal (default: 60)')
+    parser.add_argument('mp3', nargs='?', help='mp3 file to decode')
+    pargs = parser.parse_args()
+
+    if pargs.mp3 is None:
+        pcm_data, channels, sample_rate = synthetic(pargs.seconds), 2, 44100
+    else:
+        pcm_data, channels, sample_rate = decode(pargs.mp3)
+    duration = len(pcm_data) / (2 * channels * sample_rate)
+    chunks = [pcm_data[pos:pos + PCM_CHUNK]
+              for pos in range(0, len(pcm_data), PCM_CHUNK)]
+    print("{0:.1f} seconds of audio, {1} channels, {2} samples/second, "
+          "{3:.1f} MB PCM\n".format(duration, channels, sample_rate,
+                                    len(pcm_data) / 1024 ** 2))
+    print("{:<12} {:>10} {:>8} {:>10} {:>11} {:>10}".format(
+        "variant", "prep [s]", "MB/s", "realtime", "encode [s]", "total"))
+    for label, mono, out_sample_rate in VARIANTS:
+        processed = b"".join(preprocess(chunks,
+                                        channels=channels,
+                                        sample_rate=sample_rate,
+                                        mono=mono,
+                                        out_sample_rate=out_sample_rate))
+        t_prep = min(timeit.repeat(
+            lambda: sum(map(len, preprocess(chunks,
+                                            channels=channels,
+                                            sample_rate=sample_rate,
+                                            mono=mono,
+                                            out_sample_rate=out_sample_rate))),
+            number=1, repeat=pargs.repeat)) \
+            if mono or out_sample_rate else 0.
+        out_channels = 1 if mono else channels
+        params = {
+            "out_bit_rate": pargs.bitrate,
+            "out_sample_rate": out_sample_rate or sample_rate,
+            "out_channels": out_channels,
+            "out_mode": mp3.MODE_SINGLE_CHANNEL if out_channels == 1
+            else mp3.MODE_STEREO,
+            "quality": PRESETS[DEFAULT_PRESET]['quality']
+        }
+        t_encode = timeit.timeit(lambda: encode_segment(processed, params),
+                                 number=1)
+        print("{:<12} {:>10.3f} {:>8} {:>10} {:>11.2f} {:>9.1f}x".format(
+            label,
+            t_prep,
+            "{:.0f}".format(len(pcm_data) / 1024 ** 2 / t_prep)
+            if t_prep else "-",
+            "{:.0f}x".format(duration / t_prep) if t_prep else "-",
+            t_encode,
+            duration / (t_prep + t_encode)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+Throughput benchmark of the downloader against the local stand-in of the
+WDR3 site (fake_wdr3.py): the concert player pages are scanned, and their
+mp3 files downloaded, by each scraper variant in a fresh process, which
+reports pages/s, MB/s, CPU time and peak RSS:
+
+$ python3 benchmarks/throughput.py [--variants concert_downloader1 ...]
+  [--pages N] [--media N] [--size MB] [--connections N] [--concurrency N]
+  [--latency sec] [--bandwidth MB/s] [--no-range] [--fail RATE]
+  [--cut RATE] [--corrupt RATE] [--json]
+"""
+
+import contextlib
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import timeit
+from argparse import SUPPRESS, ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+DOWNLOADER = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..",
+    "WDR3_concert_downloader")
+VARIANTS = ("concert_downloader1", "concert_downloader_js")
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def worker(
+        variant: str,
+        pages: list[str],
+        connections: int,
+        concurrency: int
+) -> dict:
+    """
+    scan the pages and download their mp3 files by one scraper variant, to
+    be run in a fresh process, hence the peak RSS is its own
+    :param variant: module name of the scraper
+    :param pages: urls of the concert player pages
+    :param connections: parallel connections per mp3 file
+    :param concurrency: simultaneous page scans and mp3 downloads in total
+    :return: measurements
+    """
+    sys.path.insert(0, DOWNLOADER)
+    t_start, cpu_start = timeit.default_timer(), cpu_time()
+    module = importlib.import_module(variant)
+    from batch import PoliteSession, run_batch
+
+    t_import = timeit.default_timer()
+    with PoliteSession(pool_size=concurrency * connections,
+                       delay=0.) as session, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool, \
+            tempfile.TemporaryDirectory() as directory, \
+            contextlib.redirect_stdout(open(os.devnull, 'w')):
+        mp3_urls = dict(zip(pages, pool.map(
+            lambda url: module.extract_mp3_urls(url, session), pages)))
+        t_scan = timeit.default_timer()
+        stats = run_batch(
+            jobs=[(url, os.path.join(directory, "{}.mp3".format(i)))
+                  for i, url in enumerate(pages)],
+            extractor=lambda url, _: mp3_urls[url],
+            session=session,
+            connections=connections,
+            concurrency=concurrency)
+    t_end = timeit.default_timer()
+    size = sum(s['bytes'] for s in stats.values())
+
+    return {
+        'variant': variant,
+        'import_ms': (t_import - t_start) * 1e3,
+        'pages': len(pages),
+        'pages_per_s': len(pages) / (t_scan - t_import),
+        'files': sum(s['files'] for s in stats.values()),
+        'failed': sum(s['failed'] for s in stats.values()),
+        'mb': size / 1024 ** 2,
+        'mb_per_s': size / 1024 ** 2 / (t_end - t_scan),
+        'wall_s': t_end - t_start,
+        'cpu_s': cpu_time() - cpu_start,
+        # kB on Linux
+        'peak_rss_mb': resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Throughput benchmark")
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS),
+                        help='scraper modules (default: both)')
+    parser.add_argument('--pages', default=20, type=int,
+                        help='concert player pages (default: 20)')
+    parser.add_argument('--media', default=1, type=int,
+                        help='mp3 files per page (default: 1)')
+    parser.add_argument('--size', default=20., type=float,
+                        help='MB per mp3 file (default: 20)')
+    parser.add_argument('--connections', default=1, type=int,
+                        help='connections per mp3 file (default: 1)')
+    parser.add_argument('--concurrency', default=4, type=int,
+                        help='simultaneous requests (default: 4)')
+    parser.add_argument('--latency', default=0., type=float,
+                        help='seconds before each response (default: 0)')
+    parser.add_argument('--bandwidth', default=0., type=float,
+                        help='MB/s per connection, 0 unlimited (default: 0)')
+    parser.add_argument('--no-range', action='store_true',
+                        help='server ignores Range requests')
+    parser.add_argument('--fail', default=0., type=float,
+                        help='rate of 503 responses (default: 0)')
+    parser.add_argument('--cut', default=0., type=float,
+                        help='rate of mp3 responses cut off (default: 0)')
+    parser.add_argument('--corrupt', default=0., type=float,
+                        help='rate of corrupt mp3 responses (default: 0)')
+    parser.add_argument('--json', action='store_true',
+                        help='print one JSON line per variant')
+    parser.add_argument('--worker', help=SUPPRESS)
+    pargs = parser.parse_args()
+
+    if pargs.worker:  # child process: pages on stdin, result on stdout
+        print(json.dumps(worker(variant=pargs.worker,
+                                pages=json.load(sys.stdin),
+                                connections=pargs.connections,
+                                concurrency=pargs.concurrency)))
+        return
+
+    from fake_wdr3 import FakeWDR3
+
+    server = FakeWDR3(pages=pargs.pages,
+                      media=pargs.media,
+                      size=pargs.size,
+                      latency=pargs.latency,
+                      bandwidth=pargs.bandwidth,
+                      ranges=not pargs.no_range,
+                      fail=pargs.fail,
+                      cut=pargs.cut,
+                      corrupt=pargs.corrupt)
+    server.start()
+    if not pargs.json:
+        print("{0:<22} {1:>9} {2:>8} {3:>8} {4:>8} {5:>8} {6:>7} {7:>9}"
+              .format("variant", "import ms", "pages/s", "MB/s", "files",
+                      "failed", "CPU s", "RSS MB"))
+    try:
+        for variant in pargs.variants:
+            result = subprocess.run(
+                [sys.executable, os.path.realpath(__file__),
+                 "--worker", variant,
+                 "--connections", str(pargs.connections),
+                 "--concurrency", str(pargs.concurrency)],
+                input=json.dumps(server.page_urls()),
+                capture_output=True,
+                text=True)
+            if result.returncode:
+                print("Error: {0} - {1}".format(
+                    variant, result.stderr.strip().splitlines()[-1]))
+                continue
+            r = json.loads(result.stdout)
+            if pargs.json:
+                print(json.dumps(r))
+            else:
+                print("{0:<22} {1:>9.0f} {2:>8.1f} {3:>8.1f} {4:>8} {5:>8} "
+                      "{6:>7.2f} {7:>9.1f}".format(
+                    r['variant'], r['import_ms'], r['pages_per_s'],
+                    r['mb_per_s'], r['files'], r['failed'], r['cpu_s'],
+                    r['peak_rss_mb']))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
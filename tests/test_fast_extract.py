@@ -0,0 +1,50 @@
+"""
+Tests of the fast path extraction of the mp3 urls
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT, "WDR3_concert_downloader"),
+                os.path.join(ROOT, "benchmarks")]
+
+from fake_wdr3 import FakeWDR3  # noqa: E402
+from fast_extract import CHUNK_SIZE, scan_chunks  # noqa: E402
+
+
+def chunked(page: bytes) -> list[bytes]:
+    return [page[i:i + CHUNK_SIZE] for i in range(0, len(page), CHUNK_SIZE)]
+
+
+class TestScan(unittest.TestCase):
+    def setUp(self) -> None:
+        server = FakeWDR3(media=3)  # 200 kB filler after the media blocks
+        self.page = server.page(0)
+        server.server_close()
+
+    def test_stops_after_the_media_blocks(self) -> None:
+        raw = bytearray()
+        urls = scan_chunks(chunks=chunked(self.page), raw=raw)
+        self.assertEqual([url.rsplit("_", 1)[1] for url in urls],
+                         ["1.mp3", "2.mp3", "3.mp3"])
+        # the chunk holding the first script block after the media is
+        # the last one read
+        end = self.page.index(b"</script>", self.page.rindex(b"audioURL"))
+        end = self.page.index(b"</script>", end + 1)
+        self.assertEqual(len(raw), min(len(self.page),
+                                       -(-end // CHUNK_SIZE) * CHUNK_SIZE))
+        self.assertLess(len(raw), len(self.page) // 4)
+
+    def test_max_blocks(self) -> None:
+        self.assertEqual(len(scan_chunks(chunks=chunked(self.page),
+                                         max_blocks=2)), 2)
+
+    def test_no_script_after_the_media(self) -> None:
+        page = self.page.replace(b"globalObject.wdrPlayer", b"var x")
+        self.assertEqual(len(scan_chunks(chunks=chunked(page))), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests of the shared HTTP client against the local WDR3 stand-in
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT, "WDR3_concert_downloader"),
+                os.path.join(ROOT, "benchmarks")]
+
+from fake_wdr3 import FakeWDR3  # noqa: E402
+from http_client import HttpSession  # noqa: E402
+from stream_download import segmented_download  # noqa: E402
+
+
+class TestHostLimit(unittest.TestCase):
+    def setUp(self) -> None:
+        # slow bodies, hence all ranges of a download overlap in time
+        self.server = FakeWDR3(pages=1, size=8., bandwidth=2.)
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def download(self, connections: int, session: HttpSession = None) -> str:
+        filepath = os.path.join(self.directory.name, "a.mp3")
+        url = "{}/medp/ondemand/weltweit/fsk0/300/3000000/3000000_1.mp3" \
+            .format(self.server.base_url)
+        segmented_download(url=url,
+                           filepath=filepath,
+                           connections=connections,
+                           session=session)
+        return filepath
+
+    def test_connections_run_at_once(self) -> None:
+        with HttpSession(pool_size=8) as session:
+            filepath = self.download(connections=8, session=session)
+        self.assertEqual(self.server.peak, 8)
+        self.assertEqual(os.path.getsize(filepath), self.server.size)
+
+    def test_default_session(self) -> None:
+        self.download(connections=8)
+        self.assertEqual(self.server.peak, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
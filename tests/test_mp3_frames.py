@@ -0,0 +1,74 @@
+"""
+Tests of the incremental MPEG frame validation
+"""
+
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT, "WDR3_concert_downloader"),
+                os.path.join(ROOT, "benchmarks")]
+
+from fake_wdr3 import FRAME  # noqa: E402
+from mp3_frames import FrameError, FrameValidator  # noqa: E402
+
+ID3 = b"ID3\x04\x00\x00\x00\x00\x01\x00" + bytes(128)  # 138 bytes tag
+APE = b"APETAGEX" + bytes(24)
+LYRICS = b"LYRICSBEGIN" + b"la la la" + b"LYRICS200"
+
+
+def feed(validator: FrameValidator, data: bytes, cuts: list[int]) -> None:
+    for start, end in zip([0] + cuts, cuts + [len(data)]):
+        validator.feed(data[start:end])
+
+
+class TestTrailer(unittest.TestCase):
+    def test_trailer_split_within_its_magic(self) -> None:
+        audio = FRAME * 100
+        for trailer in (APE, LYRICS, b"TAG" + bytes(125)):
+            for cut in range(1, 8):
+                with self.subTest(trailer=trailer[:8], cut=cut):
+                    validator = FrameValidator()
+                    feed(validator, audio + trailer, [len(audio) + cut])
+                    validator.finish(content_length=len(audio + trailer))
+                    self.assertEqual(validator.frames, 100)
+
+    def test_garbage_still_detected(self) -> None:
+        validator = FrameValidator()
+        with self.assertRaises(FrameError):
+            feed(validator, FRAME * 10 + b"APEXXXXX" + bytes(24),
+                 [len(FRAME) * 10 + 4])
+
+
+class TestResume(unittest.TestCase):
+    @staticmethod
+    def resumed(data: bytes, cut: int) -> FrameValidator:
+        """
+        validate up to cut, store the state as the journal does, and
+        continue from the offset of the last valid frame
+        """
+        validator = FrameValidator()
+        validator.feed(data[:cut])
+        state = json.loads(json.dumps(validator.state))
+        resumed = FrameValidator(state=state)
+        resumed.feed(data[state['offset']:])
+        return resumed
+
+    def test_within_id3_tag(self) -> None:
+        data = ID3 + FRAME * 10
+        validator = self.resumed(data, cut=60)
+        validator.finish(content_length=len(data))
+        self.assertEqual((validator.frames, validator.audio_start),
+                         (10, len(ID3)))
+
+    def test_after_trailer(self) -> None:
+        data = FRAME * 10 + APE
+        validator = self.resumed(data, cut=len(FRAME) * 10 + 20)
+        validator.finish(content_length=len(data))
+        self.assertEqual(validator.frames, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
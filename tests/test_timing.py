@@ -0,0 +1,53 @@
+"""
+Tests of the timing events recorded for the downloads
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT, "WDR3_concert_downloader"),
+                os.path.join(ROOT, "benchmarks")]
+
+from fake_wdr3 import FakeWDR3  # noqa: E402
+from http_client import HttpSession  # noqa: E402
+from stream_download import download_task  # noqa: E402
+from timing import recorder  # noqa: E402
+
+
+class TestSegmented(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FakeWDR3(pages=1, size=2.)
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        recorder.configure(report=True)
+
+    def tearDown(self) -> None:
+        recorder.configure()
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_range_requests_count_for_the_download(self) -> None:
+        url = "{}/medp/ondemand/weltweit/fsk0/300/3000000/3000000_1.mp3" \
+            .format(self.server.base_url)
+        with HttpSession(pool_size=4) as session:
+            download_task(mp3_url=url,
+                          file_download=os.path.join(self.directory.name,
+                                                     "a.mp3"),
+                          connections=4,
+                          session=session)
+        events = recorder.report()['events']
+        requests = [e for e in events if e['event'] == 'request']
+        download, = [e for e in events if e['event'] == 'download']
+        self.assertEqual(len(requests), 5)  # HEAD and 4 ranges
+        self.assertEqual(download['requests'], 5)
+        self.assertAlmostEqual(download['connect_s'],
+                               sum(e['connect_s'] for e in requests))
+        self.assertGreater(download['connect_s'], 0.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests of the watcher polling the listing page of the local WDR3 stand-in
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from functools import partial
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT, "WDR3_concert_downloader"),
+                os.path.join(ROOT, "benchmarks")]
+
+from batch import page_output  # noqa: E402
+from concert_downloader1 import extract_mp3_urls  # noqa: E402
+from fake_wdr3 import SECTION, FakeWDR3  # noqa: E402
+from stream_download import output_name  # noqa: E402
+from watcher import WatchState, watch  # noqa: E402
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FakeWDR3(pages=3, media=2, size=0.5)
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.state = WatchState(
+            path=os.path.join(self.directory.name, "state.db"))
+
+    def tearDown(self) -> None:
+        self.state.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def poll(self) -> tuple[int, str]:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = watch(
+                listings=["{0}{1}index.html".format(self.server.base_url,
+                                                    SECTION)],
+                extractor=partial(extract_mp3_urls, cache=None),
+                state=self.state,
+                directory=self.directory.name,
+                delay=0.,
+                once=True)
+        return code, out.getvalue()
+
+    def mp3_files(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.directory.name)
+                      if name.endswith(".mp3"))
+
+    def test_second_poll_downloads_nothing(self) -> None:
+        code, out = self.poll()
+        self.assertEqual(code, 0)
+        self.assertEqual(out.count("downloaded to"), 6)
+        self.assertEqual(len(self.mp3_files()), 6)
+        self.assertEqual(self.state.pending(), [])
+
+        code, out = self.poll()
+        self.assertEqual(code, 0)
+        self.assertNotIn("downloaded to", out)
+        self.assertEqual(len(self.mp3_files()), 6)
+
+    def test_partial_site_done_without_index(self) -> None:
+        self.poll()
+        # a site interrupted after its first file
+        url = self.server.page_urls()[0]
+        filepath = page_output(url=url, directory=self.directory.name)
+        os.remove(output_name(filepath=filepath, counter=1))
+        self.state.update(url=url, done=False)
+
+        code, out = self.poll()
+        self.assertEqual(code, 0)
+        self.assertEqual(out.count("downloaded to"), 1)
+        self.assertIn("exists already", out)
+        self.assertEqual(self.state.pending(), [])
+
+        code, out = self.poll()
+        self.assertEqual(code, 0)
+        self.assertNotIn("downloaded to", out)
+
+    def test_failed_listing(self) -> None:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = watch(
+                listings=["{}/missing.html".format(self.server.base_url)],
+                extractor=partial(extract_mp3_urls, cache=None),
+                state=self.state,
+                directory=self.directory.name,
+                delay=0.,
+                once=True)
+        self.assertEqual(code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()